@@ -0,0 +1,129 @@
+'''
+Times the tokenizers and the parser on generated corpora and reports
+throughput and peak memory. Results can be saved as JSON and compared with
+the results of an earlier run:
+
+    $ python -m benchmarks --output before.json
+    $ python -m benchmarks --output after.json --compare before.json
+'''
+
+import argparse, datetime, json, os, platform, subprocess, sys, tempfile, time, tracemalloc
+
+from yaml_parser.parser import Parser
+from yaml_parser.tokenizer import file_tokenizer, string_tokenizer
+
+from .corpora import CORPORA
+
+def tokenize_file(filename, source, tokens):
+    return sum(1 for _ in file_tokenizer(filename))
+
+def tokenize_string(filename, source, tokens):
+    return sum(1 for _ in string_tokenizer(source))
+
+def parse(filename, source, tokens):
+    Parser().from_tokens(tokens)
+    return len(tokens)
+
+STAGES = {
+    'file_tokenizer': tokenize_file,
+    'string_tokenizer': tokenize_string,
+    'parse': parse,
+}
+
+def measure(stage, filename, source, tokens, repeat):
+    seconds = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = stage(filename, source, tokens)
+        elapsed = time.perf_counter() - start
+        seconds = elapsed if seconds is None else min(seconds, elapsed)
+    # Tracing allocations slows everything down, so peak memory is measured
+    # in a separate run.
+    tracemalloc.start()
+    try:
+        stage(filename, source, tokens)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return count, seconds, peak
+
+def run(corpora=None, quick=False, repeat=3):
+    with tempfile.TemporaryDirectory() as directory:
+        for name, (generate, sizes) in CORPORA.items():
+            if corpora and name not in corpora:
+                continue
+            for size in sizes[:1] if quick else sizes:
+                source = generate(size)
+                filename = os.path.join(directory, '{}-{}.yaml'.format(name, size))
+                with open(filename, 'w', encoding='utf8') as f:
+                    f.write(source)
+                tokens = list(string_tokenizer(source))
+                nbytes = len(source.encode('utf8'))
+                for stage_name, stage in STAGES.items():
+                    result = dict(corpus=name, size=size, bytes=nbytes, stage=stage_name)
+                    try:
+                        count, seconds, peak = measure(stage, filename, source, tokens, repeat)
+                    except Exception as e:
+                        result['error'] = str(e).splitlines()[0]
+                    else:
+                        result.update(
+                            tokens=count,
+                            seconds=seconds,
+                            mb_per_s=nbytes / seconds / 1e6,
+                            tokens_per_s=count / seconds,
+                            peak_bytes=peak,
+                        )
+                    yield result
+
+def metadata():
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return dict(
+        commit=commit,
+        python=sys.version.split()[0],
+        platform=platform.platform(),
+        date=datetime.datetime.now().isoformat(timespec='seconds'),
+    )
+
+def key(result):
+    return (result['corpus'], result['size'], result['stage'])
+
+def print_result(result, baseline=None):
+    line = '{:<20} {:>7} {:<17}'.format(result['corpus'], result['size'], result['stage'])
+    if 'error' in result:
+        print(line, 'failed:', result['error'])
+        return
+    line += ' {:>9.4f}s {:>8.2f} MB/s {:>11.0f} tokens/s {:>9.1f} KiB'.format(
+        result['seconds'], result['mb_per_s'], result['tokens_per_s'], result['peak_bytes'] / 1024
+    )
+    before = (baseline or {}).get(key(result))
+    if before and 'seconds' in before:
+        line += ' {:>+7.1%}'.format(result['seconds'] / before['seconds'] - 1)
+    print(line)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks')
+    parser.add_argument('corpora', nargs='*', help='One of {}'.format(', '.join(CORPORA)))
+    parser.add_argument('--quick', action='store_true', help='Only run the smallest size')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help='Save the results as JSON')
+    parser.add_argument('--compare', help='Compare with the JSON results of an earlier run')
+    args = parser.parse_args(argv)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {key(result): result for result in json.load(f)['results']}
+    results = []
+    for result in run(args.corpora, args.quick, args.repeat):
+        print_result(result, baseline)
+        results.append(result)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(dict(meta=metadata(), results=results), f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,32 @@
+'''
+Generators for synthetic YAML documents. Each generator takes a size
+parameter and returns the document as a string.
+'''
+
+def deep_nesting(depth):
+    lines = []
+    for level in range(depth):
+        lines.append('  ' * level + 'level{}:'.format(level))
+    lines.append('  ' * depth + 'value: leaf')
+    return '\n'.join(lines) + '\n'
+
+def wide_mapping(keys):
+    return ''.join('key{}: value {}\n'.format(i, i) for i in range(keys))
+
+def block_sequence(items):
+    return 'items:\n' + ''.join('  - item {}\n'.format(i) for i in range(items))
+
+def wide_flow_sequence(items):
+    return 'values: [' + ', '.join('item{}'.format(i) for i in range(items)) + ']\n'
+
+def long_scalars(length):
+    line = 'lorem ipsum dolor sit amet ' * (length // 27 + 1)
+    return ''.join('text{}: {}\n'.format(i, line[:length]) for i in range(100))
+
+CORPORA = {
+    'deep_nesting': (deep_nesting, [10, 50, 100]),
+    'wide_mapping': (wide_mapping, [1000, 10000, 100000]),
+    'block_sequence': (block_sequence, [1000, 10000, 100000]),
+    'wide_flow_sequence': (wide_flow_sequence, [1000, 10000, 100000]),
+    'long_scalars': (long_scalars, [100, 10000, 100000]),
+}
@@ -0,0 +1,45 @@
+'''
+Measures the cost of `import yaml_parser` and of loading a small file in a
+fresh interpreter, compared with bare Python startup. Each command is run in
+new processes and the fastest run is reported.
+
+    $ python -m benchmarks.import_time
+'''
+
+import os, subprocess, sys, tempfile, time
+
+from .corpora import wide_mapping
+
+COMMANDS = [
+    ('python', 'pass'),
+    ('import', 'import yaml_parser'),
+    ('load', 'import yaml_parser; yaml_parser.load({filename!r})'),
+    ('load + resolve', 'import yaml_parser; yaml_parser.load({filename!r}, resolve=True)'),
+]
+
+def best_time(code, repeat):
+    # Starts the interpreter the same way for every command, with the
+    # repository on the path.
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=root)
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], env=env, check=True)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def run(repeat=20):
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, 'small.yaml')
+        with open(filename, 'w', encoding='utf8') as f:
+            f.write(wide_mapping(20))
+        return [(name, best_time(code.format(filename=filename), repeat)) for name, code in COMMANDS]
+
+if __name__ == '__main__':
+    results = run()
+    baseline = results[0][1]
+    print('{:<16} {:>10} {:>14}'.format('command', 'ms', 'over python'))
+    for name, seconds in results:
+        print('{:<16} {:>10.1f} {:>+14.1f}'.format(name, seconds * 1e3, (seconds - baseline) * 1e3))
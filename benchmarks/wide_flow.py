@@ -0,0 +1,34 @@
+'''
+Tokenizes generated single-line flow sequences of growing width. The time per
+item should stay roughly constant, i.e. tokenizing scales linearly with the
+number of items.
+
+    $ python -m benchmarks.wide_flow
+'''
+
+import time
+
+from yaml_parser.tokenizer import string_tokenizer
+
+from .corpora import wide_flow_sequence
+
+SIZES = [1000, 2000, 4000, 8000, 16000, 32000]
+
+def run(sizes=SIZES, repeat=3):
+    results = []
+    for items in sizes:
+        source = wide_flow_sequence(items)
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in string_tokenizer(source):
+                pass
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results.append((items, best))
+    return results
+
+if __name__ == '__main__':
+    print('{:>8} {:>12} {:>12}'.format('items', 'seconds', 'us/item'))
+    for items, seconds in run():
+        print('{:>8} {:>12.4f} {:>12.3f}'.format(items, seconds, seconds / items * 1e6))
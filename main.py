@@ -1,15 +1,21 @@
 
 import argparse
-from yaml_parser import load, prettyprint
+from yaml_parser import prettyprint, Parser, Stats
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('filename')
     parser.add_argument('--parse', action='store_true')
     parser.add_argument('--pretty', action='store_true')
+    parser.add_argument('--stats', action='store_true')
     args = parser.parse_args()
     if args.pretty:
         prettyprint(args.filename)
-    if args.parse:
-        result = load(args.filename)
-        print(result)
+    if args.parse or args.stats:
+        # A single parse, whose result and measurements are printed
+        stats = Stats(memory=True) if args.stats else None
+        result = Parser(stats=stats).from_file(args.filename)
+        if args.parse:
+            print(result)
+        if args.stats:
+            print(stats)
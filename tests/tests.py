@@ -1,7 +1,24 @@
+import asyncio, io, os, random, tempfile
 from unittest import TestCase
 
-from yaml_parser.tokenizer import string_tokenizer, file_tokenizer
+from yaml_parser.tokenizer import (
+    string_tokenizer, file_tokenizer, line_tokenizer, mmap_tokenizer, compact_tokenizer,
+    BytesLexer,
+)
+from yaml_parser import load
 from yaml_parser.parser import Parser
+from yaml_parser.cache import ParseCache
+from yaml_parser.stats import Stats
+from yaml_parser.resolver import Resolver
+from yaml_parser.scalars import LazyString
+from yaml_parser.lazy import LazyLoader, LazyMapping, LazySequence
+from yaml_parser.positions import PositionParser
+from yaml_parser.events import (
+    EventParser, DocumentStart, DocumentEnd, MappingStart, MappingEnd,
+    SequenceStart, SequenceEnd, Key, Scalar, Anchor, Alias,
+)
+from yaml_parser.parallel import load_many
+from yaml_parser.incremental import IncrementalParser, EditableDocument, load_async, load_all_async
 
 class TokenizerTest(TestCase):
 
@@ -77,6 +94,23 @@ class TokenizerTest(TestCase):
         self.assertIsToken(tokens[5], 'scalar', 'baz')
         self.assertIsToken(tokens[6], 'close_sequence', ']')
 
+    def test_nested_flow_collections(self):
+        source = '{a: [1, 2], b: c}'
+        types = [token.type for token in self.get_tokens(source)]
+        self.assertListEqual(types, [
+            'open_mapping', 'scalar', 'colon', 'open_sequence', 'scalar', 'comma',
+            'scalar', 'close_sequence', 'comma', 'scalar', 'colon', 'scalar',
+            'close_mapping',
+        ])
+
+    def test_flow_sequence_across_lines(self):
+        source = 'foo: [a,\n  b]\nbar: c, d'
+        tokens = self.get_tokens(source)
+        self.assertIsToken(tokens[4], 'comma', ',')
+        self.assertIsToken(tokens[7], 'scalar', 'b')
+        self.assertIsToken(tokens[-1], 'scalar', 'd')
+        self.assertNotIn('comma', [token.type for token in tokens[9:]])
+
     def test_anchors_and_alias(self):
         source = '&foo\n*foo'
         tokens = string_tokenizer(source)
@@ -97,6 +131,16 @@ class TokenizerTest(TestCase):
         self.assertIsToken(next(tokens), 'indentation', '  ')
         self.assertIsToken(next(tokens), 'scalar', '// ||  ||__')
         
+    def test_block_scalar_lines(self):
+        source = '\n'.join(['foo: >', '  # not a comment', '    - more: indented', 'bar: baz', ''])
+        tokens = list(string_tokenizer(source))
+        self.assertIsToken(tokens[2], 'folded', '>')
+        self.assertIsToken(tokens[5], 'scalar', '# not a comment', line=2, column=3)
+        self.assertIsToken(tokens[8], 'scalar', '  - more: indented', line=3, column=3)
+        self.assertIsToken(tokens[10], 'scalar', 'bar', line=4, column=1)
+        self.assertIsToken(tokens[11], 'colon')
+        self.assertListEqual(list(compact_tokenizer(source)), tokens)
+
     def test_line_number(self):
         source = '\n'.join(
             ['one: foo',
@@ -107,6 +151,70 @@ class TokenizerTest(TestCase):
         self.assertIsToken(tokens[5], 'colon', line=2, column=4)
         self.assertIsToken(tokens[10], 'scalar', 'foobar', line=3, column=8)
 
+    def test_single_pass_matches_line_tokenizer(self):
+        filename = 'tests/invoice.example.yaml'
+        with open(filename, encoding='utf8') as f:
+            expected = [
+                token
+                for lineno, line in enumerate(f, 1)
+                for token in line_tokenizer(line, lineno)
+            ]
+        self.assertListEqual(list(file_tokenizer(filename, buffered=True)), expected)
+        self.assertListEqual(list(file_tokenizer(filename)), expected)
+
+    def test_memory_mapped_file(self):
+        filename = 'tests/simple.example.yaml'
+        tokens = list(mmap_tokenizer(filename))
+        self.assertListEqual(tokens, list(file_tokenizer(filename, buffered=True)))
+        # Columns count characters, not bytes
+        self.assertIsToken(tokens[14], 'scalar', 'Musterstraße 1', line=4, column=11)
+        self.assertIsToken(tokens[15], 'newline', '\n', line=4, column=25)
+
+    def test_bytes_non_ascii(self):
+        # Anchors with non-ASCII letters and Unicode whitespace are lexed
+        # like in str, also when regions of ASCII lines alternate with others
+        source = '\n'.join([
+            'a: &café x',
+            'b: *café',
+            'c: [1, 2,',
+            '  -\xa0d, \u3000e]',
+            'f: |',
+            '  ascii',
+            '  über',
+            '  \x1c',
+            'g: *café',
+            '',
+        ])
+        expected = list(string_tokenizer(source))
+        for region in [1, 2**16]:
+            lexer = BytesLexer()
+            lexer.region = region
+            self.assertListEqual(list(lexer.tokenize(source.encode())), expected)
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'anchors.yaml')
+            with open(filename, 'w', encoding='utf8') as f:
+                f.write('a: &café x\nb: *café\n')
+            self.assertDictEqual(Parser().from_file(filename, memory_map=True), dict(a='x', b='x'))
+
+    def test_compact_tokens(self):
+        source = 'one: foo\r\n\ntwo: [bar, baz]\n'
+        tokens = compact_tokenizer(source)
+        expected = self.get_tokens(source)
+        self.assertEqual(len(tokens), len(expected))
+        self.assertListEqual(list(tokens), expected)
+        self.assertEqual(tokens[-3], expected[-3])
+        self.assertEqual(tokens.type(6), 'scalar')
+        self.assertEqual(tokens.value(6), 'two')
+        result = Parser().from_tokens(compact_tokenizer('one: foo\ntwo:\n  - bar\n'))
+        self.assertDictEqual(result, dict(one='foo', two=['bar']))
+
+    def test_carriage_return_line_feed(self):
+        source = 'one: foo\r\ntwo: bar'
+        tokens = self.get_tokens(source)
+        self.assertIsToken(tokens[3], 'newline', '\r', line=1, column=9)
+        self.assertIsToken(tokens[4], 'newline', '\n', line=1, column=10)
+        self.assertIsToken(tokens[5], 'scalar', 'two', line=2, column=1)
+
 class ParserTest(TestCase):
 
     def from_string(self, source):
@@ -119,6 +227,11 @@ class ParserTest(TestCase):
             result['teams'][0]['league'], 'Champions League'
         )
 
+    def test_memory_mapped_example_file(self):
+        filename = 'tests/simple.example.yaml'
+        result = Parser().from_file(filename, memory_map=True)
+        self.assertDictEqual(result, Parser().from_file(filename))
+
     def test_mapping(self):
         source = '\n'.join([
             'name: Max Mustermann',
@@ -197,6 +310,18 @@ class ParserTest(TestCase):
             ['Max Mustermann', dict(street='Musterstraße', city='Neustadt'), '33']
         )
 
+    def test_compact_mapping_inside_list(self):
+        source = '\n'.join([
+            '- name: Max',
+            '  age: 33',
+            '- name: Moritz',
+        ])
+        result = self.from_string(source)
+        self.assertListEqual(
+            result,
+            [dict(name='Max', age='33'), dict(name='Moritz')]
+        )
+
     def test_explicit_document(self):
         source = '\n'.join([
             '---',
@@ -220,3 +345,927 @@ class ParserTest(TestCase):
         self.assertListEqual(
             result, ['London', 'Paris', 'Bochum']
         )
+
+    def test_flow_collections(self):
+        source = '\n'.join([
+            'values: [1, 2 , 3]',
+            'empty: [{}, []]',
+            'mapping: {name: Max, pets: [Cat, {name: Rex}], age}',
+            'pairs: [a: b, c,]',
+            'lines: [',
+            '  a,  # first',
+            '  b',
+            ']',
+            '',
+        ])
+        result = self.from_string(source)
+        self.assertDictEqual(result, dict(
+            values=['1', '2', '3'],
+            empty=[{}, []],
+            mapping=dict(name='Max', pets=['Cat', dict(name='Rex')], age=None),
+            pairs=[dict(a='b'), 'c'],
+            lines=['a', 'b'],
+        ))
+
+    def test_deep_flow_nesting(self):
+        depth = 5000
+        result = self.from_string('[' * depth + ']' * depth)
+        for level in range(depth - 1):
+            result, = result
+        self.assertListEqual(result, [])
+
+    def test_flow_anchors_and_select(self):
+        source = 'a: [&x [1, 2], {k: v}]\nb: [*x, 3]\n'
+        result = Parser(select=['b']).from_string(source)
+        self.assertDictEqual(result, dict(b=[['1', '2'], '3']))
+        result = Parser(select=['a', 1, 'k']).from_string(source)
+        self.assertDictEqual(result, dict(a=[dict(k='v')]))
+
+    def test_unclosed_flow_collection(self):
+        with self.assertRaises(Exception):
+            self.from_string('[a, b')
+
+    def test_block_scalars(self):
+        source = '\n'.join([
+            'literal: |',
+            '  one: 1',
+            '',
+            '    two',
+            'strip: |-',
+            '  text',
+            '',
+            'keep: |+',
+            '  text',
+            '',
+            'folded: >',
+            '  one',
+            '  two',
+            '',
+            '  three',
+            '    indented',
+            'items:',
+            '  - >-',
+            '    last',
+            '    item',
+            '',
+        ])
+        self.assertDictEqual(self.from_string(source), {
+            'literal': 'one: 1\n\n  two\n',
+            'strip': 'text',
+            'keep': 'text\n\n',
+            'folded': 'one two\nthree\n  indented\n',
+            'items': ['last item'],
+        })
+
+    def test_empty_block_scalar(self):
+        self.assertDictEqual(self.from_string('a: |\nb: c\n'), dict(a='', b='c'))
+
+    def test_block_scalar_header_comment(self):
+        source = 'a: | # note\n  x\nb: >- # note\n  y\n  z\n'
+        self.assertDictEqual(self.from_string(source), dict(a='x\n', b='y z'))
+
+    def test_indentation_indicator(self):
+        for header in ['|2', '|-2', '>1+']:
+            with self.assertRaisesRegex(Exception, 'Indentation indicators'):
+                self.from_string('a: {}\n   x\n'.format(header))
+
+class IterativeParserTest(ParserTest):
+
+    def from_string(self, source):
+        return Parser(iterative=True).from_string(source)
+
+    def test_deep_nesting(self):
+        depth = 5000
+        source = '\n'.join('  ' * level + 'level:' for level in range(depth))
+        source += '\n' + '  ' * depth + 'value: leaf'
+        result = self.from_string(source)
+        for level in range(depth):
+            result = result['level']
+        self.assertDictEqual(result, dict(value='leaf'))
+        with self.assertRaises(Exception):
+            Parser().from_string(source)
+
+    def test_select(self):
+        source = '\n'.join([
+            '- name: Max',
+            '  age: 33',
+            '- name: Moritz',
+            '  age: 34',
+        ])
+        result = Parser(select=[1, 'age'], iterative=True).from_string(source)
+        self.assertListEqual(result, [dict(age='34')])
+
+class DocumentStreamTest(TestCase):
+
+    def documents_from_string(self, source):
+        return Parser().documents_from_string(source)
+
+    def test_documents_are_yielded_lazily(self):
+        source = '\n'.join([
+            '---',
+            'name: Max',
+            '---',
+            'name: Moritz',
+        ])
+        documents = self.documents_from_string(source)
+        self.assertDictEqual(next(documents), dict(name='Max'))
+        self.assertDictEqual(next(documents), dict(name='Moritz'))
+        self.assertIsNone(next(documents, None))
+
+    def test_end_of_document(self):
+        source = '\n'.join([
+            '- London',
+            '...',
+            '---',
+            '- Paris',
+            '...',
+            '',
+        ])
+        result = list(self.documents_from_string(source))
+        self.assertListEqual(result, [['London'], ['Paris']])
+
+    def test_empty_document(self):
+        source = '\n'.join([
+            '---',
+            '---',
+            'name: Max',
+        ])
+        result = list(self.documents_from_string(source))
+        self.assertListEqual(result, [None, dict(name='Max')])
+
+    def test_parse_returns_first_document(self):
+        source = '\n'.join([
+            '---',
+            'name: Max',
+            '---',
+            'name: Moritz',
+        ])
+        result = Parser().from_string(source)
+        self.assertDictEqual(result, dict(name='Max'))
+
+class ParseCacheTest(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = self.write('config.yaml', 'name: Max\n')
+        self.calls = 0
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, name, source):
+        filename = os.path.join(self.directory.name, name)
+        with open(filename, 'w', encoding='utf8') as f:
+            f.write(source)
+        return filename
+
+    def parse(self, filename):
+        def parse():
+            self.calls += 1
+            return Parser().from_file(filename)
+        return parse
+
+    def test_hit(self):
+        cache = ParseCache()
+        first = cache.get(self.filename, self.parse(self.filename))
+        second = cache.get(self.filename, self.parse(self.filename))
+        self.assertEqual(self.calls, 1)
+        self.assertDictEqual(second, dict(name='Max'))
+        # Every hit is a copy
+        first['name'] = 'Moritz'
+        self.assertIsNot(first, second)
+        self.assertDictEqual(cache.get(self.filename, self.parse(self.filename)), dict(name='Max'))
+
+    def test_modified_file(self):
+        cache = ParseCache()
+        cache.get(self.filename, self.parse(self.filename))
+        self.write('config.yaml', 'name: Moritz\n')
+        stat = os.stat(self.filename)
+        os.utime(self.filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        result = cache.get(self.filename, self.parse(self.filename))
+        self.assertEqual(self.calls, 2)
+        self.assertDictEqual(result, dict(name='Moritz'))
+
+    def test_content_hash(self):
+        cache = ParseCache(key='hash')
+        cache.get(self.filename, self.parse(self.filename))
+        os.utime(self.filename, ns=(0, 0))
+        cache.get(self.filename, self.parse(self.filename))
+        self.assertEqual(self.calls, 1)
+
+    def test_eviction(self):
+        cache = ParseCache(maxsize=1)
+        other = self.write('other.yaml', 'name: Moritz\n')
+        cache.get(self.filename, self.parse(self.filename))
+        cache.get(other, self.parse(other))
+        cache.get(self.filename, self.parse(self.filename))
+        self.assertEqual(self.calls, 3)
+        self.assertEqual(len(cache.entries), 1)
+
+    def test_store_on_disk(self):
+        directory = os.path.join(self.directory.name, 'store')
+        ParseCache(directory=directory).get(self.filename, self.parse(self.filename))
+        result = ParseCache(directory=directory).get(self.filename, self.parse(self.filename))
+        self.assertEqual(self.calls, 1)
+        self.assertDictEqual(result, dict(name='Max'))
+
+    def test_disk_eviction(self):
+        directory = os.path.join(self.directory.name, 'store')
+        cache = ParseCache(maxsize=2, directory=directory)
+        other = self.write('other.yaml', 'name: Moritz\n')
+        cache.get(self.filename, self.parse(self.filename))
+        cache.get(other, self.parse(other))
+        # Results of old versions of a file are removed, too
+        for version in range(3):
+            os.utime(self.filename, ns=(0, version * 10**9))
+            cache.get(self.filename, self.parse(self.filename))
+        self.assertEqual(len(os.listdir(directory)), 2)
+        self.assertEqual(self.calls, 5)
+        # The results used last are kept
+        ParseCache(maxsize=2, directory=directory).get(self.filename, self.parse(self.filename))
+        self.assertEqual(self.calls, 5)
+        ParseCache(maxsize=2, directory=directory).get(other, self.parse(other))
+        self.assertEqual(self.calls, 6)
+
+    def test_disk_eviction_keeps_other_files(self):
+        directory = os.path.join(self.directory.name, 'store')
+        os.makedirs(directory)
+        with open(os.path.join(directory, 'foreign.pickle'), 'wb'):
+            pass
+        cache = ParseCache(maxsize=1, directory=directory)
+        other = self.write('other.yaml', 'name: Moritz\n')
+        cache.get(self.filename, self.parse(self.filename))
+        cache.get(other, self.parse(other))
+        self.assertEqual(len(os.listdir(directory)), 2)
+        self.assertIn('foreign.pickle', os.listdir(directory))
+
+class LoadManyTest(TestCase):
+
+    def test_order_and_errors(self):
+        filenames = [
+            'tests/simple.example.yaml',
+            'tests/missing.yaml',
+            'tests/simple.example.yaml',
+        ] * 3
+        results = load_many(filenames, workers=2, chunksize=2)
+        self.assertListEqual([result.filename for result in results], filenames)
+        expected = Parser().from_file('tests/simple.example.yaml')
+        for result in results[::3] + results[2::3]:
+            self.assertDictEqual(result.value, expected)
+            self.assertIsNone(result.error)
+        for result in results[1::3]:
+            self.assertIsNone(result.value)
+            self.assertIsInstance(result.error, FileNotFoundError)
+
+    def test_single_worker(self):
+        results = load_many(['tests/simple.example.yaml'], workers=1)
+        self.assertEqual(results[0].value['name'], 'Max Mustermann')
+
+class IncrementalParserTest(TestCase):
+
+    source = '\n'.join([
+        '---',
+        'name: Müller',
+        'cities:',
+        '  - London',
+        '---',
+        '- Paris',
+        '...',
+        '',
+    ]).encode()
+
+    def stream(self, source):
+        stream = asyncio.StreamReader()
+        stream.feed_data(source)
+        stream.feed_eof()
+        return stream
+
+    def test_feed_byte_by_byte(self):
+        parser = IncrementalParser()
+        documents = []
+        for i in range(len(self.source)):
+            documents.extend(parser.feed(self.source[i:i + 1]))
+            if i == self.source.index(b'---\n', 1) + 3:
+                # The first document is complete once the line starting the
+                # second one has arrived
+                self.assertEqual(len(documents), 1)
+        documents.extend(parser.close())
+        self.assertListEqual(documents, [
+            dict(name='Müller', cities=['London']),
+            ['Paris'],
+        ])
+
+    def test_close_completes_last_document(self):
+        parser = IncrementalParser()
+        self.assertListEqual(parser.feed('name: Max\nage: 3'), [])
+        self.assertListEqual(parser.close(), [dict(name='Max', age='3')])
+
+    def test_parse_while_feeding(self):
+        # Errors show as soon as the line arrives, as the document is parsed
+        # while it is fed
+        parser = IncrementalParser()
+        self.assertListEqual(parser.feed('a: 1\n'), [])
+        with self.assertRaises(Exception):
+            parser.feed('b: }\nc: 2')
+        with self.assertRaises(Exception):
+            parser.feed('d: 3\n')
+
+    def test_long_line(self):
+        parser = IncrementalParser()
+        parser.feed('a: ')
+        for _ in range(1000):
+            self.assertListEqual(parser.feed('x' * 100), [])
+        self.assertListEqual(parser.close(), [dict(a='x' * 100000)])
+
+    def test_threads_end(self):
+        # A parser ends its thread when it is closed, stopped or dropped
+        threads = []
+        for end in ['close', 'stop', 'drop']:
+            parser = IncrementalParser()
+            parser.feed('a: 1\nb: 2')
+            threads.append(parser.thread)
+            if end != 'drop':
+                getattr(parser, end)()
+            del parser
+        for thread in threads:
+            thread.join(1)
+            self.assertFalse(thread.is_alive())
+
+    def test_load_async(self):
+        async def main():
+            return await load_async(self.stream(self.source), chunk_size=3)
+        result = asyncio.run(main())
+        self.assertDictEqual(result, dict(name='Müller', cities=['London']))
+
+    def test_load_all_async(self):
+        async def main():
+            return [document async for document in load_all_async(self.stream(self.source))]
+        result = asyncio.run(main())
+        self.assertListEqual(result, [dict(name='Müller', cities=['London']), ['Paris']])
+
+class EditableDocumentTest(TestCase):
+
+    source = '\n'.join([
+        'name: Max',
+        'address:',
+        '  street: Main',
+        '  city: Neustadt',
+        'friends:',
+        '  - Fritz',
+        '  - name: Moritz',
+        '    age: 3',
+        '',
+    ])
+
+    def edit(self, document, old, new, skip=0):
+        # Replaces the first occurrence of `old` and checks the result
+        # against parsing the edited source
+        source = document.source
+        offset = source.index(old) + skip
+        expected = source[:offset] + new + source[offset + len(old) - skip:]
+        value = document.edit(offset, len(old) - skip, new)
+        self.assertEqual(document.source, expected)
+        self.assertEqual(value, Parser().from_string(expected))
+        return value
+
+    def test_reparse_smallest_block(self):
+        document = EditableDocument(self.source)
+        address, friends = document.value['address'], document.value['friends']
+        self.edit(document, 'Neustadt', 'Altstadt')
+        self.assertEqual(document.reparsed, (3, 4))
+        self.assertIs(document.value['address'], address)
+        self.edit(document, 'age: 3', 'age: 4')
+        self.assertEqual(document.reparsed, (7, 8))
+        self.assertIs(document.value['friends'], friends)
+        self.assertEqual(friends[1], dict(name='Moritz', age='4'))
+
+    def test_insert_and_delete_entries(self):
+        document = EditableDocument(self.source)
+        address = document.value['address']
+        value = self.edit(document, '  street: Main\n', '  zip: 12345\n  street: Main\n')
+        self.assertListEqual(list(value['address']), ['zip', 'street', 'city'])
+        self.assertIs(value['address'], address)
+        value = self.edit(document, '  - Fritz\n', '')
+        self.assertListEqual(value['friends'], [dict(name='Moritz', age='3')])
+        value = self.edit(document, 'friends', 'enemies')
+        self.assertListEqual(list(value), ['name', 'address', 'enemies'])
+
+    def test_full_parse(self):
+        document = EditableDocument(self.source)
+        self.edit(document, 'Max', '&name Max')
+        self.assertEqual(document.reparsed, (0, 8))
+        # Blank and comment lines do not change the value
+        value = document.value
+        self.edit(document, 'address:\n', '  # comment\n\n', skip=len('address:\n'))
+        self.assertEqual(document.reparsed, (2, 2))
+        self.assertIs(document.value, value)
+
+    def test_duplicate_keys(self):
+        # Entries with the same key as a sibling are parsed as a whole
+        document = EditableDocument('key one: y\nkey one: x')
+        value = self.edit(document, 'one: x', 'onq: x')
+        self.assertDictEqual(value, {'key one': 'y', 'key onq': 'x'})
+        document = EditableDocument('c: x\nc:\n  1: [1, 2]\na: 1')
+        value = self.edit(document, 'x', 'ax')
+        self.assertDictEqual(value, dict(c={'1': ['1', '2']}, a='1'))
+        # The edit of a single entry creates a duplicate key
+        document = EditableDocument(self.source)
+        value = self.edit(document, 'name: Max', 'friends: Max')
+        self.assertEqual(document.reparsed, (0, 8))
+        # Only entries with duplicate keys and their nodes are parsed as a
+        # whole
+        document = EditableDocument(self.source + 'name: Moritz\n')
+        self.edit(document, 'Neustadt', 'Altstadt')
+        self.assertEqual(document.reparsed, (3, 4))
+        self.edit(document, 'Max', 'Fritz')
+        self.assertEqual(document.reparsed, (0, 9))
+        self.edit(document, '  street: Main\n', '  street: Main\n  street: Side\n')
+        self.assertEqual(document.reparsed, (2, 4))
+        self.edit(document, 'Side', 'Main')
+        self.assertEqual(document.reparsed, (0, 10))
+
+    def test_collection_on_key_line(self):
+        # A sequence after a key takes the following entries, which are
+        # not sequence entries
+        document = EditableDocument('name: Max\nb: 1\n')
+        with self.assertRaises(Exception):
+            document.edit(6, 3, '- x')
+        self.assertEqual(document.source, 'name: - x\nb: 1\n')
+        self.assertDictEqual(self.edit(document, 'b: 1\n', ''), dict(name=['x']))
+
+    def test_random_edits(self):
+        # Edits give the same value, or error, as parsing the edited source
+        texts = ['- x', '- ', 'a: 1', '\n', '\n  ', '  ', ': ', 'x', 'b:\n', '\n- y', '\n  c: 2', '# c\n', 'k: v\n', '']
+        generator = random.Random(0)
+        for _ in range(200):
+            document = EditableDocument(self.source)
+            for _ in range(8):
+                source = document.source
+                offset = generator.randint(0, len(source))
+                deleted = min(generator.choice([0, 1, 2, 5]), len(source) - offset)
+                inserted = generator.choice(texts)
+                edited = source[:offset] + inserted + source[offset + deleted:]
+                try:
+                    expected = Parser().from_string(edited)
+                except Exception:
+                    with self.assertRaises(Exception):
+                        document.edit(offset, deleted, inserted)
+                else:
+                    self.assertEqual(document.edit(offset, deleted, inserted), expected)
+                self.assertEqual(document.source, edited)
+
+class EventParserTest(TestCase):
+
+    def events_from_string(self, source):
+        events = []
+        for _ in EventParser(events.append).documents_from_string(source):
+            pass
+        return events
+
+    def test_events(self):
+        source = '\n'.join([
+            'name: Max Mustermann',
+            'friends:',
+            '  - Fritz',
+            '  -',
+            '    city: Neustadt',
+        ])
+        self.assertListEqual(self.events_from_string(source), [
+            DocumentStart(),
+            MappingStart(),
+            Key('name'),
+            Scalar('Max Mustermann'),
+            Key('friends'),
+            SequenceStart(),
+            Scalar('Fritz'),
+            MappingStart(),
+            Key('city'),
+            Scalar('Neustadt'),
+            MappingEnd(),
+            SequenceEnd(),
+            MappingEnd(),
+            DocumentEnd(),
+        ])
+
+    def test_documents(self):
+        source = '\n'.join([
+            '--- London',
+            '--- Paris',
+        ])
+        self.assertListEqual(self.events_from_string(source), [
+            DocumentStart(),
+            Scalar('London'),
+            DocumentEnd(),
+            DocumentStart(),
+            Scalar('Paris'),
+            DocumentEnd(),
+        ])
+
+    def test_aliases(self):
+        source = '\n'.join([
+            '- &name Max',
+            '- *name',
+        ])
+        self.assertListEqual(self.events_from_string(source), [
+            DocumentStart(),
+            SequenceStart(),
+            Anchor('name'),
+            Scalar('Max'),
+            Alias('name'),
+            SequenceEnd(),
+            DocumentEnd(),
+        ])
+
+class AliasTest(TestCase):
+
+    source = '\n'.join([
+        'defaults: &defaults',
+        '  image: nginx',
+        '  ports:',
+        '    - 80',
+        'web:',
+        '  config: *defaults',
+        '  name: &name web',
+        'api:',
+        '  config: *defaults',
+        '  alias: *name',
+    ])
+
+    # Each anchor is aliased ten times by the next one
+    laughs = '\n'.join(['a: &a lol'] + [
+        '{}: &{}\n'.format(anchor, anchor) + '\n'.join(['  - *' + alias] * 10)
+        for alias, anchor in zip('abcdefgh', 'bcdefghi')
+    ])
+
+    def test_shared_nodes(self):
+        for iterative in [False, True]:
+            result = Parser(iterative=iterative).from_string(self.source)
+            self.assertIs(result['web']['config'], result['defaults'])
+            self.assertIs(result['api']['config'], result['defaults'])
+            self.assertEqual(result['api']['alias'], 'web')
+            self.assertDictEqual(result['defaults'], dict(image='nginx', ports=['80']))
+
+    def test_undefined_alias(self):
+        with self.assertRaises(Exception):
+            Parser().from_string('a: *b\nb: &b c')
+
+    def test_anchor_off_selected_path(self):
+        result = Parser(select=['api']).from_string(self.source)
+        self.assertDictEqual(result, dict(api=dict(
+            config=dict(image='nginx', ports=['80']),
+            alias='web',
+        )))
+
+    def test_limits(self):
+        for iterative in [False, True]:
+            with self.assertRaises(Exception):
+                Parser(iterative=iterative).from_string(self.laughs)
+            with self.assertRaises(Exception):
+                Parser(iterative=iterative, max_alias_expansion=10**9, max_alias_depth=5).from_string(self.laughs)
+            result = Parser(iterative=iterative, max_alias_expansion=10**9).from_string(self.laughs)
+            self.assertIs(result['i'][0], result['h'])
+
+    def test_wide_anchored_nodes(self):
+        # An alias counts the nodes of the anchored node
+        source = 'a: &a [{}]\nb:\n{}'.format(', '.join(['lol'] * 100), '  - *a\n' * 20)
+        for iterative in [False, True]:
+            with self.assertRaises(Exception):
+                Parser(iterative=iterative, max_alias_expansion=1000).from_string(source)
+            result = Parser(iterative=iterative, max_alias_expansion=3000).from_string(source)
+            self.assertIs(result['b'][0], result['a'])
+
+    def test_lazy(self):
+        result = LazyLoader(self.source).document()
+        self.assertIs(result['api']['config'], result['web']['config'])
+        self.assertIs(result['api']['config'], result['defaults'])
+        self.assertEqual(result['api']['alias'], 'web')
+
+    def test_lazy_nearest_anchor(self):
+        # Aliases resolve to the last anchor before them, whichever entry is
+        # accessed first
+        source = 'a: &A 1\nb: *A\nc: &A [2, &B 3]\nd: *A\ne: *B'
+        for keys in ['abcde', 'edcba']:
+            result = LazyLoader(source).document()
+            values = {key: result[key] for key in keys}
+            self.assertDictEqual(values, Parser().from_string(source))
+            self.assertIs(result['d'], result['c'])
+
+    def test_lazy_limits(self):
+        # Aliases are counted when they are accessed
+        result = LazyLoader(self.laughs).document()
+        self.assertEqual(len(result['i']), 10)
+        with self.assertRaises(Exception):
+            result['i'][0]
+        result = LazyLoader(self.laughs, max_alias_expansion=10**9, max_alias_depth=5).document()
+        with self.assertRaises(Exception):
+            result['i'][0]
+        result = LazyLoader(self.laughs, max_alias_expansion=10**9).document()
+        self.assertIs(result['i'][0], result['h'])
+
+class ResolverTest(TestCase):
+
+    def test_core_schema(self):
+        resolve = Resolver().resolve
+        for value, expected in [
+            ('null', None), ('~', None), ('true', True), ('False', False),
+            ('42', 42), ('-7', -7), ('0o17', 15), ('0x1F', 31),
+            ('1.5', 1.5), ('-.5', -0.5), ('1e3', 1000.0), ('.inf', float('inf')),
+            ('-.Inf', float('-inf')), ('yes', 'yes'), ('1.2.3', '1.2.3'), ('0x', '0x'),
+        ]:
+            self.assertEqual(resolve(value), expected)
+            self.assertIs(type(resolve(value)), type(expected))
+        self.assertNotEqual(resolve('.nan'), resolve('.nan'))
+
+    def test_memo(self):
+        resolver = Resolver(memo_size=2)
+        resolver.resolve('1')
+        resolver.resolve('1')
+        resolver.resolve('a')
+        resolver.resolve('b')
+        self.assertDictEqual(resolver.memo, {'1': 1, 'a': 'a'})
+
+    def test_parser(self):
+        source = '\n'.join([
+            '- name: Max',
+            '  age: 33',
+            '  height: 1.85',
+            '  married: false',
+            '  children: ~',
+            '- name: Erika',
+            '  age: 31',
+        ])
+        result = Parser(resolve=True).from_string(source)
+        self.assertListEqual(result, [
+            dict(name='Max', age=33, height=1.85, married=False, children=None),
+            dict(name='Erika', age=31),
+        ])
+        first, second = [list(item) for item in result]
+        self.assertIs(first[0], second[0])
+        self.assertEqual(Parser().from_string(source)[0]['age'], '33')
+
+class NumericArrayTest(TestCase):
+
+    source = '\n'.join([
+        'offsets:',
+        '  - 1',
+        '  - -2',
+        'gains:',
+        '  - 1.5',
+        '  - 2',
+        '  - 1e-3',
+        'names:',
+        '  - 1',
+        '  - nan',
+        'flags:',
+        '  - true',
+        '  - false',
+    ])
+
+    def test_arrays(self):
+        for resolve in [False, True]:
+            result = Parser(resolve=resolve, numeric_arrays=True).from_string(self.source)
+            self.assertListEqual(list(result['offsets']), [1, -2])
+            self.assertListEqual(list(result['gains']), [1.5, 2.0, 0.001])
+            # A NumPy array, or an `array.array` without NumPy
+            self.assertNotIsInstance(result['offsets'], list)
+            self.assertIsInstance(result['names'], list)
+            self.assertIsInstance(result['flags'], list)
+
+    def test_flow_sequence(self):
+        result = Parser(resolve=True, numeric_arrays=True).from_string('[1, 2, 3]')
+        self.assertListEqual(list(result), [1, 2, 3])
+        self.assertNotIsInstance(result, list)
+
+    def test_default(self):
+        self.assertListEqual(Parser().from_string(self.source)['offsets'], ['1', '-2'])
+
+class BlockScalarTest(TestCase):
+
+    source = 'script: |\n  echo 1\n  exit 0x1\ncode: 0x1\n'
+
+    def test_not_resolved(self):
+        result = Parser(resolve=True).from_string(self.source)
+        self.assertDictEqual(result, dict(script='echo 1\nexit 0x1\n', code=1))
+
+    def test_lazy(self):
+        result = Parser(lazy_block_scalars=True).from_string(self.source)
+        script = result['script']
+        self.assertIsInstance(script, LazyString)
+        self.assertEqual(len(script), 16)
+        f = io.StringIO()
+        script.write(f)
+        self.assertEqual(f.getvalue(), 'echo 1\nexit 0x1\n')
+        self.assertEqual(str(script), 'echo 1\nexit 0x1\n')
+        self.assertEqual(script, 'echo 1\nexit 0x1\n')
+
+    def test_source_map(self):
+        parser = PositionParser()
+        parser.from_string(self.source)
+        self.assertEqual(parser.source_map.span(['script']), ((1, 9), (3, 11)))
+
+class PositionsTest(TestCase):
+
+    source = '\n'.join([
+        'name: Max',
+        'pets:',
+        '  - Cat',
+        '  - name: Rex',
+        '    age: 0x0A   ',
+        '',
+    ])
+
+    def test_spans(self):
+        for iterative in [False, True]:
+            parser = PositionParser(iterative=iterative, resolve=True)
+            self.assertEqual(parser.from_string(self.source)['pets'][1]['age'], 10)
+            source_map = parser.source_map
+            self.assertEqual(len(source_map), 7)
+            self.assertEqual(source_map.span([]), ((1, 1), (5, 14)))
+            self.assertEqual(source_map.span(['name']), ((1, 7), (1, 10)))
+            self.assertEqual(source_map.span(['pets']), ((3, 3), (5, 14)))
+            self.assertEqual(source_map.span(['pets', 1]), ((4, 5), (5, 14)))
+            self.assertEqual(source_map.span(['pets', 1, 'age']), ((5, 10), (5, 14)))
+
+    def test_path_at(self):
+        parser = PositionParser()
+        parser.from_string(self.source)
+        source_map = parser.source_map
+        self.assertEqual(source_map.path_at(1, 1), ())
+        self.assertEqual(source_map.path_at(1, 8), ('name',))
+        self.assertEqual(source_map.path_at(3, 5), ('pets', 0))
+        self.assertEqual(source_map.path_at(4, 7), ('pets', 1))
+        self.assertEqual(source_map.path_at(4, 13), ('pets', 1, 'name'))
+        self.assertEqual(source_map.path_at(5, 20), None)
+
+    def test_select(self):
+        parser = PositionParser(select=['pets', '*', 'name'])
+        self.assertEqual(parser.from_string(self.source), {'pets': ['Cat', {'name': 'Rex'}]})
+        self.assertNotIn(('name',), parser.source_map.index)
+        self.assertEqual(parser.source_map.span(['pets', 1, 'name']), ((4, 11), (4, 14)))
+
+class StatsTest(TestCase):
+
+    source = '\n'.join([
+        'name: Max',
+        'teams:',
+        '  - name: Bochum',
+        '    players:',
+        '      - Gekas',
+        '',
+    ])
+
+    def test_stats(self):
+        for iterative in [False, True]:
+            stats = Stats(memory=True)
+            result = Parser(iterative=iterative, stats=stats).from_string(self.source)
+            self.assertEqual(result['teams'][0]['players'], ['Gekas'])
+            self.assertEqual(stats.token_counts['scalar'], 7)
+            self.assertEqual(stats.token_counts['colon'], 4)
+            self.assertEqual(stats.calls['block_mapping'], 0 if iterative else 2)
+            self.assertEqual(stats.calls['flow_content'], 7)
+            self.assertEqual(stats.max_depth, 4)
+            self.assertGreater(stats.peak_memory, 0)
+            self.assertAlmostEqual(stats.tokenize_time + stats.parse_time, stats.total_time)
+            self.assertIn('block_map_implicit_key', str(stats))
+
+    def test_documents(self):
+        stats = Stats()
+        documents = list(Parser(stats=stats).documents_from_string('a: b\n---\nc: d\n'))
+        self.assertEqual(documents, [{'a': 'b'}, {'c': 'd'}])
+        self.assertEqual(stats.token_counts['directive'], 1)
+        self.assertGreater(stats.total_time, 0)
+        self.assertIsNone(stats.peak_memory)
+
+    def test_disabled(self):
+        parser = Parser()
+        parser.from_string(self.source)
+        self.assertNotIn('block_mapping', vars(parser))
+
+class SelectTest(TestCase):
+
+    source = '\n'.join([
+        'services:',
+        '  web:',
+        '    image: nginx',
+        '    ports:',
+        '      - 80',
+        '      - 443',
+        '  db:',
+        '    environment:',
+        '# comment',
+        '      user: admin',
+        '    image: postgres',
+        'volumes:',
+        '  - name: data',
+        '    size: 1G',
+        '  - name: logs',
+        '    size: 2G',
+    ])
+
+    def select(self, path):
+        return Parser(select=path).from_string(self.source)
+
+    def test_wildcard(self):
+        self.assertDictEqual(self.select(['services', '*', 'image']), dict(
+            services=dict(web=dict(image='nginx'), db=dict(image='postgres'))
+        ))
+
+    def test_subtree(self):
+        self.assertDictEqual(self.select(['services', 'web']), dict(
+            services=dict(web=dict(image='nginx', ports=['80', '443']))
+        ))
+
+    def test_sequence_index(self):
+        self.assertDictEqual(self.select(['volumes', 1, 'size']), dict(
+            volumes=[dict(size='2G')]
+        ))
+        self.assertDictEqual(self.select(['volumes', '*', 'name']), dict(
+            volumes=[dict(name='data'), dict(name='logs')]
+        ))
+
+    def test_no_match(self):
+        self.assertDictEqual(self.select(['foo']), {})
+
+class LazyLoaderTest(TestCase):
+
+    def test_example_file(self):
+        with open('tests/simple.example.yaml', encoding='utf8') as f:
+            source = f.read()
+        result = LazyLoader(source).document()
+        self.assertIsInstance(result, LazyMapping)
+        self.assertEqual(result, Parser().from_string(source))
+
+    def test_children_are_parsed_on_access(self):
+        source = '\n'.join([
+            'name: Max Mustermann',
+            'address:',
+            '  street: Musterstraße',
+            '  city: Neustadt',
+            'friends:',
+            '  - Fritz',
+            '  - Moritz',
+        ])
+        result = LazyLoader(source).document()
+        self.assertListEqual(list(result), ['name', 'address', 'friends'])
+        self.assertDictEqual(result.values, {})
+        self.assertEqual(result['address']['city'], 'Neustadt')
+        self.assertListEqual(list(result.values), ['address'])
+        self.assertIs(result['address'], result['address'])
+        friends = result['friends']
+        self.assertIsInstance(friends, LazySequence)
+        self.assertListEqual(friends[-1:], ['Moritz'])
+        self.assertEqual(friends, ['Fritz', 'Moritz'])
+
+    def test_compact_mappings(self):
+        source = '\n'.join([
+            '---',
+            '- name: Max',
+            '  age: 33',
+            '- - Fritz',
+            '  - Moritz',
+            '---',
+            '- ignored',
+        ])
+        result = LazyLoader(source).document()
+        self.assertEqual(result, [dict(name='Max', age='33'), ['Fritz', 'Moritz']])
+
+    def test_load_options(self):
+        filename = 'tests/simple.example.yaml'
+        self.assertIsInstance(load(filename, lazy=True), LazyMapping)
+        for options in [dict(memory_map=True), dict(cache=ParseCache()), dict(select=['name']), dict(resolve=True)]:
+            with self.assertRaises(ValueError):
+                load(filename, lazy=True, **options)
+
+    def test_parity_with_parser(self):
+        # Empty nodes take the following lines as their node, compact
+        # sequences end the mapping of their key and explicit keys are not
+        # supported
+        def plain(node):
+            if isinstance(node, LazyMapping):
+                return {key: plain(value) for key, value in node.items()}
+            if isinstance(node, LazySequence):
+                return [plain(value) for value in node]
+            return node
+        for source in [
+            'a:\nb: 1',
+            'a:\n- 1\n- 2',
+            'a:\n- 1\n- 2\nb: 3',
+            'x:\n  a:\n  b: 1',
+            '- a\n-\n- b',
+            '- a:\n- b',
+            'a: 1\n b: 2',
+            'a:\n  g: |\n  -',
+            'a: &x\nb: 1',
+            'a:\n',
+            '? complex',
+            'a: 1\n? complex',
+        ]:
+            with self.subTest(source=source):
+                try:
+                    expected = Parser().from_string(source)
+                except Exception as error:
+                    with self.assertRaises(Exception) as context:
+                        plain(LazyLoader(source).document())
+                    self.assertEqual(str(context.exception), str(error))
+                else:
+                    self.assertEqual(plain(LazyLoader(source).document()), expected)
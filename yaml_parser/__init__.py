@@ -1,6 +1,60 @@
-
 from .parser import Parser
-from .tokenizer import prettyprint
 
-def load(filename):
-    return Parser().from_file(filename)
+# Everything else is imported on first access, so that `import yaml_parser`
+# only loads the parser and the tokenizer.
+EXPORTS = {
+    'prettyprint': 'pretty',
+    'ParseCache': 'cache',
+    'Stats': 'stats',
+    'EventParser': 'events',
+    'lazy_load': 'lazy',
+    'PositionParser': 'positions',
+    'SourceMap': 'positions',
+    'load_many': 'parallel',
+    'LoadResult': 'parallel',
+    'IncrementalParser': 'incremental',
+    'EditableDocument': 'incremental',
+    'load_async': 'incremental',
+    'load_all_async': 'incremental',
+}
+
+__all__ = ['Parser', 'load', 'load_all'] + list(EXPORTS)
+
+def __getattr__(name):
+    if name not in EXPORTS:
+        raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+    module = __import__(EXPORTS[name], globals(), level=1)
+    value = globals()[name] = getattr(module, name)
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(EXPORTS))
+
+def load(filename, memory_map=False, cache=None, select=None, iterative=False, lazy=False,
+         resolve=False, numeric_arrays=False, with_positions=False):
+    if lazy:
+        # Proxies, which parse their children on first access
+        unsupported = [name for name, used in [
+            ('memory_map', memory_map), ('cache', cache is not None), ('select', select is not None),
+            ('iterative', iterative), ('resolve', resolve), ('numeric_arrays', numeric_arrays),
+            ('with_positions', with_positions),
+        ] if used]
+        if unsupported:
+            raise ValueError('lazy is not supported with {}'.format(', '.join(unsupported)))
+        from .lazy import lazy_load
+        return lazy_load(filename)
+    def parse():
+        options = dict(select=select, iterative=iterative, resolve=resolve, numeric_arrays=numeric_arrays)
+        if with_positions:
+            # The document and the source spans of its nodes
+            from .positions import PositionParser
+            parser = PositionParser(**options)
+            return parser.from_file(filename, memory_map=memory_map), parser.source_map
+        return Parser(**options).from_file(filename, memory_map=memory_map)
+    if cache is not None:
+        options = (tuple(select) if select is not None else (), resolve, numeric_arrays, with_positions)
+        return cache.get(filename, parse, options)
+    return parse()
+
+def load_all(filename, memory_map=False):
+    return Parser().documents_from_file(filename, memory_map=memory_map)
@@ -0,0 +1,52 @@
+import re
+from array import array
+
+'''
+Conversion of homogeneous numeric sequences into arrays. NumPy is used if it
+is installed, else `array.array`.
+'''
+
+INTEGER = r'[-+]?[0-9]+ *'
+FLOAT = r'[-+]?(\.[0-9]+|[0-9]+(\.[0-9]*)?)([eE][-+]?[0-9]+)? *'
+# Scalars joined by newlines, so a whole sequence is checked in one match
+INTEGERS = re.compile(r'(?:{0}\n)*{0}'.format(INTEGER))
+FLOATS = re.compile(r'(?:{0}\n)*{0}'.format(FLOAT))
+
+NOT_IMPORTED = object()
+_numpy = NOT_IMPORTED
+
+def numpy():
+    # Imports NumPy on first use, so that it is not imported unless needed
+    global _numpy
+    if _numpy is NOT_IMPORTED:
+        try:
+            import numpy as _numpy
+        except ImportError:
+            _numpy = None
+    return _numpy
+
+def numeric_array(items):
+    '''
+    Returns `items` as an array of 64 bit integers or floats, if they are
+    all numbers or all numeric scalars. Otherwise `items` is returned as is.
+    Scalars are checked and converted in bulk.
+    '''
+    if not items:
+        return items
+    kinds = set(map(type, items))
+    np = numpy()
+    try:
+        if kinds == {str}:
+            text = '\n'.join(items)
+            if INTEGERS.fullmatch(text):
+                return np.array(items).astype(np.int64) if np is not None else array('q', map(int, items))
+            if FLOATS.fullmatch(text):
+                return np.array(items).astype(np.float64) if np is not None else array('d', map(float, items))
+            return items
+        if kinds == {int}:
+            return np.array(items, dtype=np.int64) if np is not None else array('q', items)
+        if kinds == {int, float} or kinds == {float}:
+            return np.array(items, dtype=np.float64) if np is not None else array('d', items)
+    except (ValueError, OverflowError):
+        pass
+    return items
@@ -0,0 +1,134 @@
+import collections, hashlib, os, pickle, threading
+
+# Names of the files of stored results are the prefix and a hash of the key.
+# Only these files are removed from the directory.
+STORE_PREFIX = 'yaml-parser-'
+STORE_SUFFIX = '.pickle'
+
+class ParseCache(object):
+    '''
+    LRU cache for parsed files.
+
+    Entries are keyed on the absolute path of a file and either its
+    modification time and size (`key='stat'`) or a hash of its content
+    (`key='hash'`). Results are stored pickled, so every hit returns a fresh
+    deep copy, which callers may modify freely. At most `maxsize` results are
+    kept in memory. If `directory` is given, results are also stored on disk
+    and survive restarts of the process. The directory holds at most
+    `maxsize` results as well: the least recently used ones, by modification
+    time, are removed, including the results of old versions of files. Other
+    files in the directory are left alone.
+    '''
+
+    def __init__(self, maxsize=128, key='stat', directory=None):
+        if key not in ['stat', 'hash']:
+            raise ValueError('Invalid value for key: "{}"'.format(key))
+        self.maxsize = maxsize
+        self.key = key
+        self.directory = directory
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        # The number of results in `directory`, which is counted on the first
+        # write
+        self.stored = None
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def get(self, filename, parse, options=()):
+        '''
+        Returns the cached result for `filename`, calling `parse()` on a miss.
+        `options` must be hashable and distinguish results of different
+        parser settings for the same file.
+        '''
+        key = self.make_key(filename, options)
+        with self.lock:
+            data = self.entries.get(key)
+            if data is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return pickle.loads(data)
+        data = self.read(key)
+        if data is None:
+            data = pickle.dumps(parse(), pickle.HIGHEST_PROTOCOL)
+            self.write(key, data)
+        with self.lock:
+            self.misses += 1
+            self.entries[key] = data
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        return pickle.loads(data)
+
+    def make_key(self, filename, options):
+        path = os.path.abspath(filename)
+        if self.key == 'hash':
+            with open(filename, 'rb') as f:
+                version = hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+        else:
+            stat = os.stat(filename)
+            version = (stat.st_mtime_ns, stat.st_size)
+        return (path, version, options)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def store_path(self, key):
+        digest = hashlib.blake2b(repr(key).encode(), digest_size=16).hexdigest()
+        return os.path.join(self.directory, STORE_PREFIX + digest + STORE_SUFFIX)
+
+    def read(self, key):
+        if not self.directory:
+            return None
+        path = self.store_path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            # Modification times order the stored results by their last use
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return data
+
+    def write(self, key, data):
+        if not self.directory:
+            return
+        path = self.store_path(key)
+        new = not os.path.exists(path)
+        temp = '{}.{}.tmp'.format(path, os.getpid())
+        with open(temp, 'wb') as f:
+            f.write(data)
+        os.replace(temp, path)
+        # The directory is only scanned, when it may hold too many results
+        with self.lock:
+            if self.stored is not None:
+                self.stored += new
+            full = self.stored is None or self.stored > self.maxsize
+        if full:
+            self.prune(path)
+
+    def prune(self, keep):
+        # Removes the least recently used results from the directory, except
+        # for the one at `keep`, until nine tenths of `maxsize` are left, so
+        # that it is scanned only once per a tenth of `maxsize` writes. Other
+        # processes may use the same directory, so files may vanish meanwhile.
+        stored = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                name = entry.name
+                if name.startswith(STORE_PREFIX) and name.endswith(STORE_SUFFIX) and entry.path != keep:
+                    try:
+                        stored.append((entry.stat().st_mtime_ns, entry.path))
+                    except FileNotFoundError:
+                        pass
+        stored.sort()
+        removed = max(len(stored) + 1 - (self.maxsize - self.maxsize // 10), 0)
+        for _, path in stored[:removed]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        with self.lock:
+            self.stored = len(stored) + 1 - removed
@@ -0,0 +1,82 @@
+import collections
+
+from .parser import Parser
+
+DocumentStart = collections.namedtuple('DocumentStart', [])
+DocumentEnd = collections.namedtuple('DocumentEnd', [])
+MappingStart = collections.namedtuple('MappingStart', [])
+MappingEnd = collections.namedtuple('MappingEnd', [])
+SequenceStart = collections.namedtuple('SequenceStart', [])
+SequenceEnd = collections.namedtuple('SequenceEnd', [])
+Key = collections.namedtuple('Key', ['value'])
+Scalar = collections.namedtuple('Scalar', ['value'])
+Anchor = collections.namedtuple('Anchor', ['name'])
+Alias = collections.namedtuple('Alias', ['name'])
+
+class EventParser(Parser):
+    '''
+    Parser, which passes events to `handler` instead of building dicts and
+    lists. The events are produced by the grammar methods of `Parser` in
+    document order, so only the current path through the document is held in
+    memory:
+
+        MappingStart()
+        Key(value='name')
+        Scalar(value='Max')
+        MappingEnd()
+
+    An `Anchor` event precedes the events of the anchored node. Aliases are
+    passed as `Alias` events and are not expanded.
+
+    `from_file` and `from_string` return `None`.
+    '''
+
+    def __init__(self, handler, **options):
+        super().__init__(**options)
+        self.handler = handler
+
+    def any_document(self):
+        self.handler(DocumentStart())
+        super().any_document()
+        self.handler(DocumentEnd())
+
+    def start_mapping(self):
+        self.handler(MappingStart())
+
+    def mapping_key(self, key):
+        self.handler(Key(key))
+
+    def set_item(self, mapping, key, value):
+        pass
+
+    def end_mapping(self, mapping):
+        self.handler(MappingEnd())
+
+    def start_sequence(self):
+        self.handler(SequenceStart())
+
+    def add_item(self, sequence, item):
+        pass
+
+    def end_sequence(self, sequence):
+        self.handler(SequenceEnd())
+
+    def scalar(self, value):
+        self.handler(Scalar(value))
+
+    def properties(self):
+        name = super().properties()
+        if name is not None:
+            self.handler(Anchor(name))
+        return name
+
+    def alias(self, name):
+        self.handler(Alias(name))
+
+    def skip_anchored_node(self, indentation):
+        # Aliases are not resolved, so skipped anchored nodes are not needed
+        self.advance()
+        return False
+
+    def skip_anchored_flow_node(self, n, c):
+        self.advance()
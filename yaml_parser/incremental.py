@@ -0,0 +1,563 @@
+import asyncio, bisect, codecs, io, itertools, queue, threading, weakref
+
+from .parser import Parser, LINE_PREFIX
+from .tokenizer import Lexer, OPENING, line_tokenizer
+
+class IncrementalParser(object):
+    '''
+    Push parser, which is fed a YAML stream chunk by chunk, e.g. as it is
+    received from a socket.
+
+    Every complete line is tokenized as soon as it arrives; only a trailing
+    incomplete line is buffered, so tokens split across chunks are never
+    seen half. The tokens of each chunk are passed on to a `Parser`, which
+    runs in a thread of its own and builds the documents as their tokens
+    arrive, so neither the text nor the tokens of a document are held.
+    `feed` returns, once the parser has consumed the tokens of the chunk,
+    so parsing is spread over the chunks. `feed_async` and `close_async`
+    wait for the parser without blocking the event loop.
+
+    The thread ends with `close`, which completes the last document, with
+    `stop`, which drops it, with an error, or when the parser is garbage
+    collected.
+    '''
+
+    def __init__(self, encoding='utf8'):
+        self.decoder = codecs.getincrementaldecoder(encoding)()
+        self.lexer = Lexer()
+        # The chunks of the trailing incomplete line
+        self.pending = []
+        self.lineno = 1
+        self.closed = False
+        # Batches of tokens to the parser and their results back
+        self.batches = queue.SimpleQueue()
+        self.consumed = queue.SimpleQueue()
+        self.thread = threading.Thread(target=parse_batches, args=(self.batches,), daemon=True)
+        self.thread.start()
+        # The thread does not refer to the parser, so a parser, which is
+        # dropped without `close` or `stop`, is collected and ends it.
+        self.finalizer = weakref.finalize(self, self.batches.put, None)
+
+    def feed(self, chunk):
+        '''
+        Feeds `chunk` (`bytes` or `str`) and returns a list of the documents,
+        which have been completed by it.
+        '''
+        tokens = self.complete_lines(chunk)
+        if tokens is None:
+            return []
+        self.batches.put((tokens, False, self.consumed.put))
+        return self.completed(self.consumed.get())
+
+    def close(self):
+        '''
+        Signals the end of the stream and returns a list of the remaining
+        documents.
+        '''
+        if self.closed:
+            return []
+        self.batches.put((self.remaining_lines(), True, self.consumed.put))
+        return self.completed(self.consumed.get())
+
+    async def feed_async(self, chunk):
+        '''
+        Like `feed`, but awaits the parser.
+        '''
+        tokens = self.complete_lines(chunk)
+        if tokens is None:
+            return []
+        return self.completed(await self.parse_async(tokens, False))
+
+    async def close_async(self):
+        '''
+        Like `close`, but awaits the parser.
+        '''
+        if self.closed:
+            return []
+        return self.completed(await self.parse_async(self.remaining_lines(), True))
+
+    def stop(self):
+        # Ends the thread of the parser without completing the documents,
+        # e.g. when the rest of the stream is not needed
+        self.closed = True
+        self.finalizer()
+
+    def complete_lines(self, chunk):
+        # Returns the tokens of the lines completed by `chunk`, or None
+        if self.closed:
+            raise Exception('Parser has been closed')
+        if isinstance(chunk, bytes):
+            chunk = self.decoder.decode(chunk)
+        # Only the new chunk is searched for the end of a line
+        end = chunk.rfind('\n') + 1
+        if not end:
+            self.pending.append(chunk)
+            return None
+        self.pending.append(chunk[:end])
+        lines, self.pending = ''.join(self.pending), [chunk[end:]]
+        return self.tokenize(lines)
+
+    def remaining_lines(self):
+        # Returns the tokens of the trailing incomplete line at the end of
+        # the stream
+        self.closed = True
+        self.pending.append(self.decoder.decode(b'', final=True))
+        lines, self.pending = ''.join(self.pending), []
+        return self.tokenize(lines)
+
+    def tokenize(self, lines):
+        tokens = list(self.lexer.tokenize(lines, self.lineno))
+        self.lineno += lines.count('\n')
+        return tokens
+
+    def parse_async(self, tokens, final):
+        # Passes `tokens` to the parser and returns a future of its result,
+        # which is set in the event loop
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        def done(result):
+            loop.call_soon_threadsafe(set_result, future, result)
+        self.batches.put((tokens, final, done))
+        return future
+
+    def completed(self, result):
+        # Returns the documents, which the parser has completed with a batch
+        documents, error = result
+        if error is not None:
+            self.stop()
+            raise error
+        return documents
+
+def parse_batches(batches):
+    # Runs in the thread of an `IncrementalParser`. Parses the tokens of the
+    # batches from `batches` and calls the callback of each batch with the
+    # documents, which have been completed meanwhile, and an error, once
+    # the parser asks for a token after its last one. Ends after the final
+    # batch, on an error or on None.
+    documents = []
+    done = None
+    def tokens():
+        nonlocal documents, done
+        while True:
+            batch = batches.get()
+            if batch is None:
+                done = None
+                return
+            items, final, done = batch
+            yield from items
+            if final:
+                return
+            completed, documents = documents, []
+            done((completed, None))
+    error = None
+    try:
+        for document in Parser().documents_from_tokens(tokens()):
+            documents.append(document)
+    except Exception as exception:
+        error = exception
+    if done is not None:
+        done((documents, error))
+
+def set_result(future, result):
+    # The task awaiting the future may have been cancelled
+    if not future.done():
+        future.set_result(result)
+
+async def load_async(stream, chunk_size=2**16, encoding='utf8'):
+    '''
+    Reads from an asyncio `stream` (any object with a coroutine
+    `read(n)`) and returns its first document, like `load`.
+    '''
+    documents = load_all_async(stream, chunk_size, encoding)
+    try:
+        async for document in documents:
+            return document
+    finally:
+        await documents.aclose()
+
+async def load_all_async(stream, chunk_size=2**16, encoding='utf8'):
+    '''
+    Reads from an asyncio `stream` and yields each document as soon as it is
+    complete.
+    '''
+    parser = IncrementalParser(encoding)
+    try:
+        while True:
+            chunk = await stream.read(chunk_size)
+            if not chunk:
+                break
+            for document in await parser.feed_async(chunk):
+                yield document
+        for document in await parser.close_async():
+            yield document
+    finally:
+        parser.stop()
+
+# Tokens, which are re-parsed only as part of the whole document
+NON_LOCAL = frozenset(['directive', 'end_of_document', 'anchor', 'alias', 'literal', 'folded'])
+
+class EditableDocument(object):
+    '''
+    Parsed document, which is updated in place by text edits, e.g. as a
+    config editor sends them on each keystroke.
+
+    The tokens of each line are kept. An edit re-tokenizes the changed lines
+    only and re-parses the smallest block around them, which is found from
+    the indentation of the lines: the entries of the innermost collection,
+    which contain all changed lines. The new entries replace the old ones in
+    that collection, all other nodes are reused.
+
+    Edits, which touch flow collections, block scalars, document markers,
+    anchors or aliases, or which change the kind of a collection or start a
+    block collection on the line of a key, fall back to parsing the whole
+    document. So do edits of entries with duplicate keys, or within their
+    nodes, as these entries of the source do not correspond to those of the
+    value.
+    '''
+
+    def __init__(self, source):
+        self.lines = split_lines(source)
+        self.parse()
+
+    @property
+    def source(self):
+        return ''.join(self.lines)
+
+    def parse(self):
+        # Tokenizes and parses the whole document
+        self.tokens, self.depths = [], []
+        lexer = Lexer()
+        for lineno, line in enumerate(self.lines, 1):
+            # Lines, which may belong to a block scalar, count as nested, as
+            # their tokens depend on the lines before.
+            self.depths.append(lexer.depth + (lexer.block_scalar is not None))
+            self.tokens.append(list(line_tokenizer(line, lineno, lexer=lexer)))
+        self.indents = [line_indent(tokens) for tokens in self.tokens]
+        self.entries = [entry_chain(tokens) for tokens in self.tokens]
+        root = next((indent for indent in self.indents if indent is not None), 0)
+        self.regular = regular(self.tokens, root)
+        self.offsets = None
+        self.value = None
+        self.reparsed = (0, len(self.lines))
+        parser = DuplicateKeyParser()
+        self.value = parser.from_tokens(token for tokens in self.tokens for token in tokens)
+        self.duplicated = parser.duplicated
+        return self.value
+
+    def edit(self, offset, deleted, inserted):
+        '''
+        Replaces `deleted` characters at `offset` by the string `inserted`
+        and returns the updated value. `reparsed` is set to the range of
+        lines, which have been parsed again.
+        '''
+        lines = self.lines
+        end = offset + deleted
+        if not 0 <= offset <= end <= self.line_offset(len(lines)):
+            raise Exception('Edit ({}, {}) is out of range'.format(offset, deleted))
+        first = self.line_at(offset, bisect.bisect_right) - 1
+        if first == len(lines) and lines and not lines[-1].endswith(('\n', '\r')):
+            first -= 1 # appending to the last line
+        last = max(first, self.line_at(end, bisect.bisect_left) - 1)
+        start = self.line_offset(first)
+        if not deleted and offset == start and inserted.endswith('\n'):
+            last = first - 1 # whole lines are inserted before line `first`
+        text = ''.join(lines[first:last + 1])
+        text = text[:offset - start] + inserted + text[end - start:]
+        if last + 1 < len(lines) and not text.endswith('\n'):
+            # The line break of the last line was removed
+            last += 1
+            text += lines[last]
+        new_lines = split_lines(text)
+        old_tokens = self.tokens[first:last + 1]
+        old_entries = self.entries[first:last + 1]
+        old_indents = self.indents[first:last + 1]
+
+        lexer = Lexer()
+        new_tokens = []
+        for lineno, line in enumerate(new_lines, first + 1):
+            new_tokens.append(list(line_tokenizer(line, lineno, lexer=lexer)))
+        stop = first + len(new_lines)
+        lines[first:last + 1] = new_lines
+        self.tokens[first:last + 1] = new_tokens
+        self.depths[first:last + 1] = [0] * len(new_lines)
+        self.indents[first:last + 1] = [line_indent(tokens) for tokens in new_tokens]
+        self.entries[first:last + 1] = [entry_chain(tokens) for tokens in new_tokens]
+        self.splice_offsets(first, len(old_tokens), new_lines)
+
+        local = (
+            self.regular and self.value is not None and lexer.depth == 0
+            and (first >= len(self.depths) or self.depths[first] == 0)
+            and (stop >= len(self.depths) or self.depths[stop] == 0)
+            and not any(token.type in NON_LOCAL or token.type in OPENING
+                        for tokens in old_tokens + new_tokens for token in tokens)
+        )
+        if local:
+            changed = [indent for indent in old_indents + self.indents[first:stop] if indent is not None]
+            if not changed:
+                # Only blank and comment lines changed
+                self.reparsed = (first, first)
+                return self.value
+            if self.reparse(first, stop, min(changed), old_entries):
+                return self.value
+        return self.parse()
+
+    def line_offset(self, line):
+        # The offset of the start of `line` in the source. The starts of the
+        # lines after the last edit are not updated, but shifted by the
+        # length difference of the edits.
+        if self.offsets is None:
+            self.offsets = [0] + list(itertools.accumulate(map(len, self.lines)))
+            self.shift = (len(self.lines), 0)
+        shifted, delta = self.shift
+        return self.offsets[line] + (delta if line > shifted else 0)
+
+    def line_at(self, offset, bisect):
+        # Bisects the line starts for `offset`
+        self.line_offset(0)
+        shifted, delta = self.shift
+        if shifted + 1 == len(self.offsets) or offset < self.offsets[shifted + 1] + delta:
+            return bisect(self.offsets, offset, 0, shifted + 1)
+        return bisect(self.offsets, offset - delta, shifted + 1)
+
+    def splice_offsets(self, first, count, new_lines):
+        # Replaces the starts of `count` lines from `first` by those of
+        # `new_lines`. Moving the shift to the edited lines updates the
+        # starts in between, so edits close to each other are cheap.
+        offsets = self.offsets
+        if offsets is None:
+            return
+        shifted, delta = self.shift
+        if delta and shifted < first:
+            offsets[shifted + 1:first + 1] = [offset + delta for offset in offsets[shifted + 1:first + 1]]
+        elif delta and shifted > first:
+            offsets[first + 1:shifted + 1] = [offset - delta for offset in offsets[first + 1:shifted + 1]]
+        end = offsets[first + count] + (delta if count else 0)
+        starts = list(itertools.accumulate(map(len, new_lines), initial=offsets[first]))
+        offsets[first + 1:first + count + 1] = starts[1:]
+        self.shift = (first + len(new_lines), delta + starts[-1] - end)
+
+    def reparse(self, first, stop, m, old_entries):
+        # Re-parses the entries around the changed lines first to stop, whose
+        # smallest indentation (before or after the edit) is `m`. Returns
+        # False, if the whole document must be parsed instead.
+        indents, entries = self.indents, self.entries
+        if first < stop and entries[first] and old_entries and old_entries[0] and entries[first][0][0] == old_entries[0][0][0] == m:
+            # The first changed line starts an entry before and after the edit
+            start = first
+        else:
+            start = first - 1
+            while start >= 0 and (indents[start] is None or indents[start] > m):
+                start -= 1
+            if start < 0 or not entries[start] or entries[start][0][0] != indents[start]:
+                return False
+        column = indents[start]
+        end = stop
+        while end < len(indents) and (indents[end] is None or indents[end] > column):
+            end += 1
+        # The old entries in the block
+        old = [chain[0][1] for chain in entries[start:first] + old_entries + entries[stop:end] if chain and chain[0][0] == column]
+        # An entry with an empty node, which is followed by a line at its
+        # own indentation, is parsed as a mapping containing that line. So
+        # blocks next to such an entry are not re-parsed on their own.
+        above = start - 1
+        while above >= 0 and indents[above] is None:
+            above -= 1
+        if above >= 0 and indents[above] == column and opens_block(self.tokens[above]):
+            return False
+        below = end - 1
+        while indents[below] is None:
+            below -= 1
+        if end < len(indents) and indents[end] == column and opens_block(self.tokens[below]):
+            return False
+        if not regular(self.tokens[start:end], column):
+            return False
+        path = self.locate(start, column)
+        if path is None:
+            return False
+        # Entries with duplicate keys do not correspond to the value, so the
+        # block must neither be inside nor contain one
+        container = self.value
+        try:
+            for key in path[:-1]:
+                if key in self.duplicated.get(id(container), ()):
+                    return False
+                container = container[key]
+        except (KeyError, IndexError, TypeError):
+            return False
+        if any(key in self.duplicated.get(id(container), ()) for key in old):
+            return False
+        tokens = []
+        for lineno, line in enumerate(self.tokens[start:end], start + 1):
+            tokens.extend(token if token.line == lineno else token._replace(line=lineno) for token in line)
+        parser = DuplicateKeyParser()
+        try:
+            block = parser.from_tokens(tokens)
+        except Exception:
+            return False
+        if isinstance(container, list) and isinstance(block, list):
+            if path[-1] + len(old) > len(container):
+                return False
+            container[path[-1]:path[-1] + len(old)] = block
+        elif isinstance(container, dict) and isinstance(block, dict):
+            if not all(key in container for key in old):
+                return False
+            if any(key in container and key not in old for key in block):
+                return False # a new key duplicates one outside the block
+            if len(old) == 1 and len(block) == 1 and old[0] in block:
+                container[old[0]] = block[old[0]]
+            else:
+                # Keep the order of the entries
+                items = list(container.items())
+                position = list(container).index(old[0])
+                items[position:position + len(old)] = block.items()
+                container.clear()
+                container.update(items)
+        else:
+            return False
+        if id(block) in parser.duplicated:
+            # The new entries duplicate each other
+            self.duplicated.setdefault(id(container), set()).update(parser.duplicated.pop(id(block)))
+        self.duplicated.update(parser.duplicated)
+        self.reparsed = (start, end)
+        return True
+
+    def locate(self, line, column):
+        # Returns the path to the entry, which starts at `column` of `line`.
+        # Sequence indices are counted from the entries above.
+        entries, indents = self.entries, self.indents
+        path = []
+        while True:
+            chain = entries[line]
+            index = [c for c, _ in chain].index(column)
+            key = chain[index][1]
+            if index:
+                # Compact collections start on the line of their parent entry
+                path.append(0 if key is None else key)
+                column = chain[index - 1][0]
+                continue
+            parent = line - 1
+            if column == 0:
+                parent = -1 # top level collections have no parent
+            while parent >= 0 and (indents[parent] is None or indents[parent] >= column):
+                parent -= 1
+            # Every line indented like the entry starts a preceding entry,
+            # which are counted for sequences only
+            siblings = indents[parent + 1:line].count(column) if key is None else 0
+            if parent >= 0 and any(c == column for c, _ in entries[parent]):
+                siblings += 1
+            else:
+                following = parent + 1
+                while indents[following] is None:
+                    following += 1
+                if indents[following] != column:
+                    return None # the collection starts at another column
+            path.append(siblings if key is None else key)
+            if parent < 0:
+                break
+            columns = [c for c, _ in entries[parent] if c < column]
+            if not columns:
+                return None # not inside a block collection
+            line = parent
+            column = columns[-1]
+        path.reverse()
+        return path
+
+class DuplicateKeyParser(Parser):
+    # Parser, which notes the duplicate keys of each mapping by its id. Ids
+    # of mappings, which have been replaced since, may be reused, which only
+    # makes edits fall back to a full parse.
+
+    def start(self):
+        self.duplicated = {}
+        super().start()
+
+    def set_item(self, mapping, key, value):
+        if key in mapping:
+            self.duplicated.setdefault(id(mapping), set()).add(key)
+        mapping[key] = value
+
+def split_lines(text):
+    # Lines with their line breaks, split like the tokenizer counts lines
+    return io.StringIO(text, newline='').readlines()
+
+def line_indent(tokens):
+    # The indentation of a line, or None for blank and comment lines
+    for token in tokens:
+        if token.type not in LINE_PREFIX:
+            return token.column - 1
+    return None
+
+def opens_block(tokens):
+    # Whether a line ends with an indicator, whose node starts on the next line
+    for token in reversed(tokens):
+        if token.type not in LINE_PREFIX:
+            return token.type in ('colon', 'dash')
+    return False
+
+def regular(lines, column):
+    # Whether the indentation of `lines`, a block starting at `column`, is
+    # consistent: a line is indented deeper than the previous one only for
+    # the node of an entry of that line, a dedent returns to an enclosing
+    # level and all entries at a level are of the same kind. Lines with a
+    # key and a block collection as its value, which `Parser` reads as
+    # taking the following entries, are not regular either, nor are lines
+    # with characters skipped by the lexer before their first token.
+    levels = []
+    previous = None
+    for tokens in lines:
+        indent = line_indent(tokens)
+        if indent is None:
+            continue
+        chain = entry_chain(tokens)
+        kind = chain[0][1] is None if chain else None
+        if key_line_collection(tokens) or indent != indentation_width(tokens):
+            return False
+        if previous is None:
+            if indent != column:
+                return False
+        elif indent > levels[-1][0]:
+            if not opens_block(previous) and indent not in [c for c, _ in entry_chain(previous)]:
+                return False
+        else:
+            if opens_block(previous):
+                return False # the empty node of the previous line
+            while levels and indent < levels[-1][0]:
+                levels.pop()
+            if not levels or levels[-1][0] != indent or levels[-1][1] != kind or kind is None:
+                return False
+            previous = tokens
+            continue
+        levels.append((indent, kind))
+        previous = tokens
+    return True
+
+def key_line_collection(tokens):
+    # Whether a block sequence or mapping starts after a colon on a line
+    colon = False
+    for token in tokens:
+        if token.type == 'colon':
+            if colon:
+                return True
+            colon = True
+        elif colon and token.type in ('dash', 'complex_mapping_key'):
+            return True
+    return False
+
+def indentation_width(tokens):
+    # The indentation of a line, as `Parser.indent` sees it
+    return len(tokens[0].value) if tokens and tokens[0].type == 'indentation' else 0
+
+def entry_chain(tokens):
+    # Returns the (column, key) of the entries, which start on a line, with
+    # None as the key of sequence entries, e.g. [(0, None), (2, 'name')] for
+    # "- name: Max".
+    chain = []
+    for index, token in enumerate(tokens):
+        if token.type == 'dash':
+            chain.append((token.column - 1, None))
+        elif token.type == 'scalar' and index + 1 < len(tokens) and tokens[index + 1].type == 'colon':
+            chain.append((token.column - 1, token.value))
+            break
+        elif token.type != 'indentation':
+            break
+    return chain
@@ -0,0 +1,451 @@
+import bisect, collections.abc
+
+from .parser import Parser
+from .tokenizer import CompactTokens, TYPE_CODES
+
+NEWLINE = TYPE_CODES['newline']
+INDENTATION = TYPE_CODES['indentation']
+COMMENT = TYPE_CODES['comment']
+TAG = TYPE_CODES['tag']
+DASH = TYPE_CODES['dash']
+COLON = TYPE_CODES['colon']
+SCALAR = TYPE_CODES['scalar']
+ANCHOR = TYPE_CODES['anchor']
+ALIAS = TYPE_CODES['alias']
+BLOCK_SCALAR = {TYPE_CODES['literal'], TYPE_CODES['folded']}
+OPENING = {TYPE_CODES['open_sequence'], TYPE_CODES['open_mapping']}
+CLOSING = {TYPE_CODES['close_sequence'], TYPE_CODES['close_mapping']}
+BOUNDARIES = {TYPE_CODES['directive'], TYPE_CODES['end_of_document']}
+SKIPPED = {NEWLINE, INDENTATION, COMMENT, TAG}
+
+class LazyLoader(object):
+    '''
+    Loads a document as `LazyMapping` and `LazySequence` proxies for its block
+    collections. Creating a proxy scans the tokens of the collection once to
+    record the token span of each child; a child is parsed only when it is
+    accessed first. Collections, which `Parser` does not read entry by entry
+    (e.g. with an empty node before the next entry), are parsed whole, so
+    that both give the same nodes and errors.
+
+    Aliases resolve to the node (or proxy) of the nearest anchor before
+    them. An anchored node, which has not been accessed yet, is loaded when
+    an alias to it is. Like `Parser`, the loader limits the nodes reached
+    through aliases and the nesting of aliases within anchored nodes. The
+    nodes of an anchored node are estimated from its tokens, as it is not
+    built.
+    '''
+
+    def __init__(self, source, max_alias_expansion=10**6, max_alias_depth=100):
+        self.tokens = CompactTokens(source)
+        self.max_alias_expansion = max_alias_expansion
+        self.max_alias_depth = max_alias_depth
+        self.expansion = 0
+        # The anchored nodes and their expansion and alias depth by the
+        # index of their anchor
+        self.anchored = {}
+        self.alias_costs = {}
+        # The indices of the anchors by their name, collected on the first
+        # alias
+        self.anchor_indices = None
+
+    def document(self):
+        # The span of the first document
+        types = self.tokens.types
+        start, end = 0, len(types)
+        while start < end and types[start] in SKIPPED:
+            start += 1
+        if start < end and types[start] == TYPE_CODES['directive']:
+            start += 1
+        for index in range(start, end):
+            if types[index] in BOUNDARIES and self.tokens.column(index) == 1:
+                end = index
+                break
+        return self.node(start, end)
+
+    def node(self, start, end, n=-1, c='block-in', indentation=-1):
+        # Returns the node in the span from token `start` to `end`, which
+        # `Parser` reads as `block_node(n, c)` with `indentation` as the
+        # indentation of the current line
+        tokens = self.tokens
+        types = tokens.types
+        first = start
+        while first < end and types[first] in SKIPPED:
+            if types[first] == NEWLINE:
+                indentation = 0
+            elif types[first] == INDENTATION:
+                indentation = tokens.ends[first] - tokens.starts[first]
+            first += 1
+        if first == end:
+            return None
+        if types[first] == ALIAS:
+            return self.alias(tokens.value(first)[1:], first)
+        if types[first] == ANCHOR:
+            node = self.anchored.get(first, MISSING)
+            if node is MISSING:
+                node = self.anchored[first] = self.node(first + 1, end, n, c, indentation)
+            return node
+        if types[first] == DASH:
+            spans = self.entries(first, end, DASH)
+            if spans is not None:
+                return LazySequence(self, spans, indentation)
+        elif types[first] == SCALAR and first + 1 < end and types[first + 1] == COLON:
+            spans = self.entries(first, end, SCALAR)
+            if spans is not None:
+                return LazyMapping(self, spans, indentation)
+        parser = LazyParser(self, start, (n, c, indentation))
+        return parser.from_tokens(tokens.tokens(first, end))
+
+    def entry(self, start, end, n=None):
+        # Returns the node of the sequence entry, whose dash is before token
+        # `start`. The entry is nested in the indentation `n` of its line,
+        # which later entries start. A node on the line of the dash starts
+        # a compact collection at its column.
+        tokens = self.tokens
+        if n is None:
+            n = tokens.column(start - 1) - 1
+        first = start
+        while first < end and tokens.types[first] == TAG:
+            first += 1
+        indentation = n
+        if first < end and tokens.types[first] not in SKIPPED:
+            indentation = tokens.column(first) - 1
+        return self.node(start, end, n, 'block-in', indentation)
+
+    def alias(self, name, before):
+        # Returns the node of the last anchor `name` before token `before`
+        anchor = self.anchor_before(name, before)
+        expansion, depth = self.alias_cost(anchor)
+        self.expansion += expansion
+        if self.expansion > self.max_alias_expansion:
+            raise Exception('Aliases expand to more than {} nodes'.format(self.max_alias_expansion))
+        if depth + 1 > self.max_alias_depth:
+            raise Exception('Aliases are nested deeper than {}'.format(self.max_alias_depth))
+        return self.node(anchor, self.extent(anchor))
+
+    def anchor_before(self, name, before):
+        # Returns the index of the last anchor `name` before token `before`
+        if self.anchor_indices is None:
+            self.anchor_indices = {}
+            for index, code in enumerate(self.tokens.types):
+                if code == ANCHOR:
+                    self.anchor_indices.setdefault(self.tokens.value(index)[1:], []).append(index)
+        indices = self.anchor_indices.get(name, [])
+        position = bisect.bisect_left(indices, before)
+        if not position:
+            raise Exception('Undefined alias "{}"'.format(name))
+        return indices[position - 1]
+
+    def alias_cost(self, anchor):
+        # Returns the expansion and alias depth of the node with the anchor
+        # at token `anchor`. Its nodes are counted as its scalars and flow
+        # collections, including keys, plus the expansion of its aliases.
+        costs = self.alias_costs.get(anchor)
+        if costs is None:
+            self.alias_costs[anchor] = RECURSIVE
+            types = self.tokens.types
+            expansion, depth = 1, 0
+            try:
+                for index in range(anchor + 1, self.extent(anchor)):
+                    code = types[index]
+                    if code == SCALAR or code in OPENING:
+                        expansion += 1
+                    elif code == ALIAS:
+                        target = self.anchor_before(self.tokens.value(index)[1:], index)
+                        alias_expansion, alias_depth = self.alias_cost(target)
+                        expansion += alias_expansion
+                        depth = max(depth, alias_depth + 1)
+            except Exception:
+                del self.alias_costs[anchor]
+                raise
+            costs = self.alias_costs[anchor] = (expansion, depth)
+        elif costs is RECURSIVE:
+            raise Exception('Recursive alias to the anchor at {}'.format(self.tokens[anchor]))
+        return costs
+
+    def index(self, token):
+        # The index of `token` among the tokens
+        tokens = self.tokens
+        return bisect.bisect_left(tokens.starts, tokens.line_starts[token.line - 1] + token.column - 1)
+
+    def extent(self, anchor):
+        # Returns the end of the span of the node with the anchor at token
+        # `anchor`: the closing token of a flow collection, the token of a
+        # scalar or alias, else the first line indented less than the
+        # collection (or, for a sequence, not starting another entry).
+        types, starts, ends = self.tokens.types, self.tokens.starts, self.tokens.ends
+        first = anchor + 1
+        while first < len(types) and types[first] in SKIPPED:
+            first += 1
+        if first == len(types):
+            return first
+        if types[first] in OPENING:
+            depth = 0
+            for index in range(first, len(types)):
+                if types[index] in OPENING:
+                    depth += 1
+                elif types[index] in CLOSING:
+                    depth -= 1
+                    if not depth:
+                        return index + 1
+            return len(types)
+        kind = None
+        indentation = self.tokens.column(first) - 1
+        if types[first] == DASH:
+            kind = DASH
+        elif types[first] == SCALAR and first + 1 < len(types) and types[first + 1] == COLON:
+            kind = SCALAR
+        elif types[first] in BLOCK_SCALAR:
+            # Content lines are indented deeper than the line of the header
+            kind = SCALAR
+            line = first
+            while line > 0 and types[line - 1] != NEWLINE:
+                line -= 1
+            indentation = ends[line] - starts[line] + 1 if types[line] == INDENTATION else 1
+        if kind is None:
+            return first + 1
+        depth = 0
+        width = None
+        for index in range(first + 1, len(types)):
+            code = types[index]
+            if code == NEWLINE:
+                width = 0
+            elif code == INDENTATION:
+                width = ends[index] - starts[index]
+            elif width is not None:
+                if depth == 0 and (code in BOUNDARIES or width < indentation or (width == indentation and kind == DASH and code != DASH)):
+                    return index
+                width = None
+            if code in OPENING:
+                depth += 1
+            elif code in CLOSING and depth:
+                depth -= 1
+        return len(types)
+
+    def entries(self, first, end, kind):
+        # Returns the spans of the nodes of the entries of the collection,
+        # whose first entry starts at token `first`. Entries start with a
+        # token of type `kind` at the column of the first one. Returns None
+        # for collections, which `Parser` reads differently from such a
+        # split: with other tokens at the column of the entries (e.g. a
+        # sequence or an explicit key in a mapping), with empty nodes (the
+        # following lines become their node), with lines after a scalar or
+        # flow collection node or with duplicate keys.
+        tokens = self.tokens
+        types, starts, ends = tokens.types, tokens.starts, tokens.ends
+        indentation = tokens.column(first) - 1
+        entries = [first]
+        lines = []
+        depth = 0
+        # The indentation of the current line, until its first token
+        width = None
+        for index in range(first + 1, end):
+            code = types[index]
+            if code == NEWLINE:
+                width = 0
+                line = index + 1
+            elif code == INDENTATION:
+                width = ends[index] - starts[index]
+            elif width is not None:
+                if width <= indentation and depth == 0:
+                    if code != kind or width < indentation:
+                        return None
+                    entries.append(index)
+                    lines.append(line)
+                width = None
+            if code in OPENING:
+                depth += 1
+            elif code in CLOSING and depth:
+                depth -= 1
+        lines.append(end)
+        spans = [(entry + 1 if kind == DASH else entry + 2, stop) for entry, stop in zip(entries, lines)]
+        if kind == SCALAR and any(entry + 1 == end or types[entry + 1] != COLON for entry in entries):
+            return None
+        for start, stop in spans:
+            if self.empty(start, stop) or self.open(start, stop) or not self.complete(start, stop):
+                return None
+        if kind == DASH:
+            return spans
+        spans = {tokens.value(entry): span for entry, span in zip(entries, spans)}
+        if len(spans) < len(entries):
+            # The nodes of duplicate keys are built, too
+            return None
+        return spans
+
+    def empty(self, start, stop):
+        # Whether the span holds no node, except for properties
+        types = self.tokens.types
+        return all(types[index] in SKIPPED or types[index] == ANCHOR for index in range(start, stop))
+
+    def open(self, start, stop):
+        # Whether the span ends with an entry with an empty node
+        types = self.tokens.types
+        last = stop - 1
+        while last >= start and (types[last] in SKIPPED or types[last] == ANCHOR):
+            last -= 1
+        return last >= start and types[last] in (COLON, DASH)
+
+    def complete(self, start, stop):
+        # Whether the span holds no tokens after a scalar, alias or flow
+        # collection node and no lines indented less than a block collection
+        types = self.tokens.types
+        first = start
+        while first < stop and (types[first] in SKIPPED or types[first] == ANCHOR):
+            first += 1
+        if first == stop:
+            return True
+        if types[first] == DASH or types[first] == SCALAR and first + 1 < stop and types[first + 1] == COLON:
+            starts, ends = self.tokens.starts, self.tokens.ends
+            indentation = self.tokens.column(first) - 1
+            depth = 0
+            width = None
+            for index in range(first + 1, stop):
+                code = types[index]
+                if code == NEWLINE:
+                    width = 0
+                elif code == INDENTATION:
+                    width = ends[index] - starts[index]
+                elif width is not None:
+                    if depth == 0 and width < indentation:
+                        return False
+                    width = None
+                if code in OPENING:
+                    depth += 1
+                elif code in CLOSING and depth:
+                    depth -= 1
+            return True
+        if types[first] in OPENING:
+            depth = 0
+            for first in range(first, stop):
+                if types[first] in OPENING:
+                    depth += 1
+                elif types[first] in CLOSING:
+                    depth -= 1
+                    if not depth:
+                        break
+        elif types[first] in BLOCK_SCALAR:
+            # Content lines are scalars indented deeper than the line of the
+            # header and at least as deep as the first one
+            starts, ends = self.tokens.starts, self.tokens.ends
+            line = first
+            while line > 0 and types[line - 1] != NEWLINE:
+                line -= 1
+            header = ends[line] - starts[line] if types[line] == INDENTATION else 0
+            indentation = width = None
+            for index in range(first + 1, stop):
+                code = types[index]
+                if code == NEWLINE:
+                    width = 0
+                elif code == INDENTATION:
+                    width = ends[index] - starts[index]
+                elif code == COMMENT and width is None:
+                    pass
+                elif code != SCALAR or width is None or width <= header or width < (indentation or width):
+                    return False
+                else:
+                    indentation = indentation or width
+                    width = None
+            return True
+        elif types[first] not in (SCALAR, ALIAS) or first + 1 < stop and types[first + 1] == COLON:
+            return True
+        return all(types[index] in SKIPPED for index in range(first + 1, stop))
+
+class LazyParser(Parser):
+    # Parses the nodes, which are not block collections. Aliases resolve to,
+    # and anchors are registered with, the whole document of `loader`.
+
+    def __init__(self, loader, start, context=(-1, 'block-in', -1)):
+        super().__init__(
+            max_alias_expansion=loader.max_alias_expansion,
+            max_alias_depth=loader.max_alias_depth,
+        )
+        self.loader = loader
+        self.start_index = start
+        # The arguments of `block_node` and the indentation of the line, at
+        # which the node starts in the document
+        self.context = context
+        self.anchor_tokens = []
+
+    def bare_document(self):
+        n, c, self.indentation = self.context
+        return self.block_node(n, c)
+
+    def alias(self, name):
+        if name in self.anchors:
+            return super().alias(name)
+        return self.loader.alias(name, self.start_index)
+
+    def properties(self):
+        token = self.current
+        name = super().properties()
+        if name is not None:
+            self.anchor_tokens.append(self.loader.index(token))
+        return name
+
+    def anchor(self, name, node):
+        super().anchor(name, node)
+        self.loader.anchored.setdefault(self.anchor_tokens.pop(), node)
+
+MISSING = object()
+# Marks the alias costs of an anchored node, which are being computed
+RECURSIVE = object()
+
+class LazyMapping(collections.abc.Mapping):
+    # `indentation` is the indentation of the line of the first key, as
+    # `Parser` sees it: the values of all entries are nested in it.
+
+    def __init__(self, loader, spans, indentation):
+        self.loader = loader
+        self.spans = spans
+        self.indentation = indentation
+        self.first = next(iter(spans.values()))[0]
+        self.values = {}
+
+    def __getitem__(self, key):
+        value = self.values.get(key, MISSING)
+        if value is MISSING:
+            start, end = self.spans[key]
+            # Later keys start their lines
+            line = self.indentation if start == self.first else self.loader.tokens.column(start - 2) - 1
+            value = self.values[key] = self.loader.node(start, end, self.indentation, 'block-out', line)
+        return value
+
+    def __iter__(self):
+        return iter(self.spans)
+
+    def __len__(self):
+        return len(self.spans)
+
+    def __repr__(self):
+        return 'LazyMapping({})'.format(dict(self))
+
+class LazySequence(collections.abc.Sequence):
+
+    def __init__(self, loader, spans, indentation):
+        self.loader = loader
+        self.spans = spans
+        self.indentation = indentation
+        self.values = [MISSING] * len(spans)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        value = self.values[index]
+        if value is MISSING:
+            start, end = self.spans[index]
+            value = self.values[index] = self.loader.entry(start, end, self.indentation if index == 0 else None)
+        return value
+
+    def __len__(self):
+        return len(self.spans)
+
+    def __eq__(self, other):
+        if not isinstance(other, collections.abc.Sequence) or isinstance(other, str):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    def __repr__(self):
+        return 'LazySequence({})'.format(list(self))
+
+def lazy_load(filename, encoding='utf8', max_alias_expansion=10**6, max_alias_depth=100):
+    with open(filename, encoding=encoding) as f:
+        return LazyLoader(f.read(), max_alias_expansion, max_alias_depth).document()
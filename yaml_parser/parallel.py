@@ -0,0 +1,39 @@
+import collections, os
+from concurrent.futures import ProcessPoolExecutor
+
+from .parser import Parser
+
+LoadResult = collections.namedtuple('LoadResult', ['filename', 'value', 'error'])
+
+def load_many(filenames, workers=None, chunksize=None, memory_map=False):
+    '''
+    Loads many independent files on a pool of `workers` processes and
+    returns a `LoadResult` for each file, in the order of `filenames`. A
+    file that fails to load has its exception as `error` and does not
+    abort the others. Files are sent to the workers in chunks of
+    `chunksize` files to keep the overhead of inter-process communication
+    low.
+    '''
+    filenames = list(filenames)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(filenames) <= 1:
+        return load_chunk(filenames, memory_map)
+    if not chunksize:
+        chunksize = max(1, -(-len(filenames) // (workers * 4)))
+    chunks = [filenames[i:i + chunksize] for i in range(0, len(filenames), chunksize)]
+    results = []
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as executor:
+        for chunk in executor.map(load_chunk, chunks, [memory_map] * len(chunks)):
+            results.extend(chunk)
+    return results
+
+def load_chunk(filenames, memory_map=False):
+    results = []
+    for filename in filenames:
+        try:
+            value = Parser().from_file(filename, memory_map=memory_map)
+        except Exception as e:
+            results.append(LoadResult(filename, None, e))
+        else:
+            results.append(LoadResult(filename, value, None))
+    return results
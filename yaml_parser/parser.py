@@ -1,36 +1,158 @@
 
-from .tokenizer import file_tokenizer, string_tokenizer
+from .tokenizer import file_tokenizer, mmap_tokenizer, string_tokenizer, BLOCK_SCALAR
+from .scalars import block_scalar_parts, LazyString
 
 '''
 Recursive descent parser based on YAML grammar according to 
     	http://yaml.org/spec/1.2/spec.html#Syntax
 '''
 
+# Tokens, which are skipped by `advance`
+SKIPPED = frozenset(['tag'])
+# Tokens, which end the current document
+BOUNDARIES = frozenset(['directive', 'end_of_document'])
+# Tokens, which are consumed by `indent`
+LINE_PREFIX = frozenset(['newline', 'indentation', 'comment'])
+# Tokens, which start a line without content
+BLANK_LINE = frozenset(['newline', 'comment'])
+
+# Productions of s-l+block-node(n,c) and s-l+block-collection(n,c) by the
+# type of the current token
+BLOCK_NODE = {
+    'dash': 'block_in_block',
+    'complex_mapping_key': 'block_in_block',
+    'literal': 'block_in_block',
+    'folded': 'block_in_block',
+}
+BLOCK_COLLECTION = {
+    'dash': 'block_sequence',
+    'complex_mapping_key': 'block_mapping',
+    'scalar': 'block_mapping',
+}
+# Marks that no node is to be added to the innermost collection yet
+NO_NODE = object()
+# Closing tokens of flow collections by their opening tokens
+FLOW_COLLECTION = {
+    'open_sequence': 'close_sequence',
+    'open_mapping': 'close_mapping',
+}
+FLOW_CLOSING = frozenset(FLOW_COLLECTION.values())
+
+# Contexts of ns-plain(n,c)
+PLAIN = frozenset(['flow-out', 'flow-in', 'block-key', 'flow-key'])
+
 class Parser(object):
 
-    def from_file(self, filename, encoding='utf8'):
-        self.tokenizer = file_tokenizer(filename)
+    def __init__(self, select=None, iterative=False, max_alias_expansion=10**6, max_alias_depth=100,
+                 resolve=False, numeric_arrays=False, lazy_block_scalars=False, stats=None):
+        # `select` is a path like ['services', '*', 'image'] of keys, sequence
+        # indices or '*'. Subtrees off this path are skipped without building
+        # them.
+        self.select = select
+        self.path = None if select is None else []
+        if iterative:
+            # Parse nested block collections with an explicit stack instead
+            # of recursive calls, so the depth of a document is not limited
+            # by the recursion limit.
+            self.block_node = self.iterative_block_node
+        # Aliases share the anchored node instead of copying it. To protect
+        # consumers, which walk the document as a tree, against exponential
+        # expansion ("billion laughs"), the number of nodes reached through
+        # aliases and the nesting of aliases within anchored nodes are
+        # limited per document.
+        self.max_alias_expansion = max_alias_expansion
+        self.max_alias_depth = max_alias_depth
+        # With `resolve`, plain scalars are typed according to the core
+        # schema while they are tokenized, see `resolver.Resolver`. Optional
+        # modules are only imported when they are used.
+        self.resolver = None
+        if resolve:
+            from .resolver import Resolver
+            self.resolver = Resolver()
+        # With `numeric_arrays`, sequences of numbers are returned as arrays,
+        # see `arrays.numeric_array`.
+        self.numeric_arrays = numeric_arrays
+        if numeric_arrays:
+            from .arrays import numeric_array
+            self.numeric_array = numeric_array
+        # With `lazy_block_scalars`, block scalars are returned as
+        # `scalars.LazyString`s, whose content lines are joined on first use.
+        self.lazy_block_scalars = lazy_block_scalars
+        # With `stats`, a `stats.Stats` instruments this parser. Otherwise
+        # nothing is measured, and no method is wrapped.
+        self.stats = stats
+        if stats is not None:
+            stats.instrument(self)
+
+    def from_file(self, filename, encoding='utf8', memory_map=False):
+        if memory_map:
+            self.tokenizer = mmap_tokenizer(filename, encoding)
+        else:
+            self.tokenizer = file_tokenizer(filename, buffered=True)
         return self.parse()
 
     def from_string(self, source):
         self.tokenizer = string_tokenizer(source)
         return self.parse()
 
-    def parse(self):
+    def documents_from_file(self, filename, encoding='utf8', memory_map=False):
+        if memory_map:
+            self.tokenizer = mmap_tokenizer(filename, encoding)
+        else:
+            self.tokenizer = file_tokenizer(filename)
+        return self.iter_documents()
+
+    def documents_from_string(self, source):
+        self.tokenizer = string_tokenizer(source)
+        return self.iter_documents()
+
+    def from_tokens(self, tokens):
+        self.tokenizer = iter(tokens)
+        return self.parse()
+
+    def documents_from_tokens(self, tokens):
+        self.tokenizer = iter(tokens)
+        return self.iter_documents()
+
+    def start(self):
+        if self.resolver is not None:
+            self.tokenizer = self.resolver.tokens(self.tokenizer)
         self.current = None
-        self.next = next(self.tokenizer)
+        self.next = next(self.tokenizer, None)
         self.advance()
         self.indentation = -1
+
+    def parse(self):
+        self.start()
         try:
-            return self.stream()
-        except:
-            raise Exception('Parser failed at {}.\nNext token is: {}.'.format(self.current, self.next))
+            return next(self.stream(), None)
+        except Exception as error:
+            raise self.failure(error)
+
+    def iter_documents(self):
+        # Documents are yielded as soon as they are complete, so only one
+        # document is held in memory at a time.
+        self.start()
+        documents = self.stream()
+        while True:
+            try:
+                document = next(documents)
+            except StopIteration:
+                return
+            except Exception as error:
+                raise self.failure(error)
+            yield document
+
+    def failure(self, error):
+        # Errors raised by the grammar methods themselves give the reason
+        reason = ' ({})'.format(error) if type(error) is Exception else ''
+        return Exception('Parser failed at {}{}.\nNext token is: {}.'.format(self.current, reason, self.next))
 
     def advance(self):
         self.current, self.next = self.next, next(self.tokenizer, None)
         # skip some tokens:
-        while self.current and self.current.type in ['tag']:
-            self.advance()
+        while self.current is not None and self.current.type in SKIPPED:
+            self.current, self.next = self.next, next(self.tokenizer, None)
 
     def consume_and_advance(self):
         output = self.current.value
@@ -43,7 +165,38 @@ class Parser(object):
                         ( l-document-suffix+ l-document-prefix* l-any-document?
                         | l-document-prefix* l-explicit-document? )*        
         '''
-        return self.any_document()
+        while self.document_prefix():
+            self.indentation = -1
+            self.anchors = {}
+            # Expansion and alias depth of the anchored nodes. The anchored
+            # nodes, which are still being parsed, hold the number of nodes
+            # before them and the expansion and depth of their aliases.
+            self.alias_costs = {}
+            self.open_anchors = []
+            self.expansion = 0
+            self.nodes = 0
+            yield self.any_document()
+            self.document_suffix()
+
+    def document_prefix(self):
+        '''
+        l-document-prefix ::= c-byte-order-mark? l-comment*
+        '''
+        self.indent()
+        return self.current is not None
+
+    def document_suffix(self):
+        '''
+        l-document-suffix ::= c-document-end s-l-comments
+        c-document-end 	::= 	“.” “.” “.”
+        '''
+        self.indent()
+        while self.current and self.current.type == 'end_of_document':
+            self.advance()
+            self.indent()
+
+    def at_document_boundary(self):
+        return self.current is None or self.current.type in BOUNDARIES
 
     def any_document(self):
         '''
@@ -51,7 +204,9 @@ class Parser(object):
                    | l-explicit-document
                    | l-bare-document
         '''
-        return self.explicit_document() or self.bare_document() # TODO: directive-document
+        if self.current.type == 'directive':
+            return self.explicit_document()
+        return self.bare_document() # TODO: directive-document
 
     def bare_document(self):
         '''
@@ -66,22 +221,169 @@ class Parser(object):
                                         | ( e-node s-l-comments ) ) 
         c-directives-end 	::= 	“-” “-” “-”
         '''
-        if self.current.value != '---':
+        if self.current.type != 'directive':
             return
         self.advance()
-        return self.bare_document() # TODO: e-node, comments
+        self.indent()
+        if self.at_document_boundary():
+            return None # e-node
+        return self.bare_document() # TODO: comments
 
     def block_node(self, n, c):
         '''
         s-l+block-in-block(n,c) | s-l+flow-in-block(n)
         '''
-        return self.block_in_block(n, c) or self.flow_in_block(n) 
+        self.indent()
+        anchor = self.properties()
+        if anchor is not None:
+            self.indent()
+        production = BLOCK_NODE.get(self.current.type)
+        if production is None and self.next is not None and self.next.type == 'colon':
+            # An implicit key starts a block mapping
+            production = 'block_in_block'
+        if production is None:
+            node = self.flow_in_block(n)
+        else:
+            node = getattr(self, production)(n, c)
+        if anchor is not None:
+            self.anchor(anchor, node)
+        return node
+
+    def iterative_block_node(self, n, c):
+        '''
+        s-l+block-node(n,c), with the productions for nested block collections
+        down to their entries' nodes unrolled into a loop over an explicit
+        stack. Frames are [is_mapping, collection, n+m, key or index, anchor].
+        '''
+        stack = []
+        node = self.open_block_node(n, c, stack)
+        while stack:
+            frame = stack[-1]
+            is_mapping, collection, n_plus_m, key, anchor = frame
+            if node is not NO_NODE:
+                if is_mapping:
+                    self.set_item(collection, key, node)
+                else:
+                    self.add_item(collection, node)
+                    frame[3] += 1
+                self.leave()
+                node = NO_NODE
+            self.indent()
+            if self.indentation < n_plus_m or self.at_document_boundary():
+                stack.pop()
+                node = self.end_mapping(collection) if is_mapping else self.end_sequence(collection)
+                if anchor is not None:
+                    self.anchor(anchor, node)
+            elif is_mapping:
+                # ns-l-block-map-implicit-entry(n+m)
+                indentation = self.current.column - 1
+                key = self.block_map_implicit_key()
+                if not self.enter(key):
+                    self.skip_block(indentation)
+                    continue
+                frame[3] = key
+                self.mapping_key(key)
+                if not self.current.type == 'colon':
+                    raise Exception('Expected a "colon", found a {}'.format(self.current))
+                self.advance()
+                node = self.open_block_node(n_plus_m, 'block-out', stack)
+            else:
+                # c-l-block-seq-entry(n+m)
+                if not self.enter(frame[3]):
+                    self.skip_block(self.current.column - 1)
+                    frame[3] += 1
+                    continue
+                if not self.current.type == 'dash':
+                    raise Exception('Expected a "dash", found a {}'.format(self.current))
+                n_entry = self.indentation
+                self.advance()
+                if self.current and self.current.type not in LINE_PREFIX:
+                    self.indentation = self.current.column - 1
+                node = self.open_block_node(n_entry, 'block-in', stack)
+        return node
+
+    def open_block_node(self, n, c, stack):
+        # Returns the node, unless it is a block collection, which is pushed
+        # onto `stack` instead.
+        self.indent()
+        anchor = self.properties()
+        if anchor is not None:
+            self.indent()
+        production = BLOCK_NODE.get(self.current.type)
+        if production is None and self.next is not None and self.next.type == 'colon':
+            production = 'block_in_block'
+        if production is None:
+            node = self.flow_in_block(n)
+        elif self.current.type in BLOCK_SCALAR:
+            node = self.block_scalar(n, c)
+        elif BLOCK_COLLECTION.get(self.current.type, 'block_mapping') == 'block_sequence':
+            stack.append([False, self.start_sequence(), self.indentation, 0, anchor])
+            return NO_NODE
+        elif self.current.type == 'complex_mapping_key' or (self.next is not None and self.next.type == 'colon'):
+            stack.append([True, self.start_mapping(), self.indentation, None, anchor])
+            return NO_NODE
+        else:
+            node = None
+        if anchor is not None:
+            self.anchor(anchor, node)
+        return node
 
     def block_in_block(self, n, c):
         '''
         s-l+block-in-block(n,c) ::= s-l+block-scalar(n,c) | s-l+block-collection(n,c)
         '''
-        return self.block_collection(n, c) # TODO: block-scalar
+        if self.current.type in BLOCK_SCALAR:
+            return self.block_scalar(n, c)
+        return self.block_collection(n, c)
+
+    def block_scalar(self, n, c):
+        '''
+        s-l+block-scalar(n,c) ::= s-separate(n+1,c)
+                                  ( c-ns-properties(n+1,c) s-separate(n+1,c) )?
+                                  ( c-l+literal(n) | c-l+folded(n) )
+        c-l+literal(n) ::= “|” c-b-block-header(m,t) l-literal-content(n+m,t)
+        c-l+folded(n) ::= “>” c-b-block-header(m,t) l-folded-content(n+m,t)
+        '''
+        # The lexer emits each content line as its indentation and a single
+        # scalar token. The lines are collected and joined once. Content
+        # lines start at the indentation of the first one, which must be
+        # deeper than `n`. The first one is a whole line, unlike a key,
+        # which may follow an empty block scalar.
+        header = self.current
+        chomping = header.value[1:]
+        if chomping.strip('-+'):
+            raise Exception('Indentation indicators of block scalars are not supported')
+        self.advance()
+        if self.current is not None and self.current.type == 'comment':
+            self.advance()
+        lines = []
+        content = None
+        last = header.line
+        # The line of the last line break
+        end = last - 1
+        current = self.current
+        while current is not None:
+            kind = current.type
+            if kind == 'newline':
+                self.indentation = 0
+                end = current.line
+            elif kind == 'indentation':
+                self.indentation = len(current.value)
+            elif kind == 'scalar' and current.column - 1 == self.indentation and (
+                    self.indentation == content or content is None and self.indentation > n
+                    and (self.next is None or self.next.type == 'newline')):
+                content = self.indentation
+                lines.append((current.line - last - 1, current.value))
+                last = current.line
+            else:
+                break
+            self.advance()
+            current = self.current
+        breaks = end - last + 1 if lines else end - last
+        parts = block_scalar_parts(lines, header.type == 'folded', chomping, max(breaks, 0))
+        if self.lazy_block_scalars:
+            return self.scalar(LazyString(parts))
+        return self.scalar(''.join(parts))
 
     def block_collection(self, n, c):
         '''
@@ -103,7 +405,8 @@ class Parser(object):
         s-flow-line-prefix(n) 	::= 	s-indent(n) s-separate-in-line?
         '''
         self.indent()
-        return self.block_mapping(n) or self.block_sequence(n) # TODO: comments, properties, separate
+        production = BLOCK_COLLECTION.get(self.current.type, 'block_mapping')
+        return getattr(self, production)(n) # TODO: comments, properties, separate
 
     def block_mapping(self, n):
         '''
@@ -115,32 +418,37 @@ class Parser(object):
         # If not, return.
         if self.current.type != 'complex_mapping_key' and (self.next == None or self.next.type != 'colon'):
             return
-        mapping = {}
+        mapping = self.start_mapping()
         n_plus_m = self.indentation
-        while self.current:
+        while self.current is not None:
             self.indent()
-            if self.indentation < n_plus_m:
+            if self.indentation < n_plus_m or self.at_document_boundary():
                 break
-            entry = self.block_map_entry(n_plus_m)            
-            mapping.update(entry)
-        return mapping
+            self.block_map_entry(n_plus_m, mapping)
+        return self.end_mapping(mapping)
 
-    def block_map_entry(self, n):
+    def block_map_entry(self, n, mapping):
         '''
         ns-l-block-map-entry(n) ::=   c-l-block-map-explicit-entry(n)
                             | ns-l-block-map-implicit-entry(n)
         '''
-        return self.block_map_implicit_entry(n) # TODO: block-map-explicit-entry
+        # The entry is inserted into `mapping` directly
+        self.block_map_implicit_entry(n, mapping) # TODO: block-map-explicit-entry
         
-    def block_map_implicit_entry(self, n):
+    def block_map_implicit_entry(self, n, mapping):
         '''
         ns-l-block-map-implicit-entry(n) ::= ( ns-s-block-map-implicit-key
                                      | e-node )
                                      c-l-block-map-implicit-value(n)
         '''
+        indentation = self.current.column - 1
         key = self.block_map_implicit_key() # TODO: e-node
-        value = self.block_map_implicit_value(n)
-        return {key: value} # TODO: e-node
+        if not self.enter(key):
+            self.skip_block(indentation)
+            return
+        self.mapping_key(key)
+        self.set_item(mapping, key, self.block_map_implicit_value(n))
+        self.leave() # TODO: e-node
 
     def block_map_implicit_key(self):
         '''
@@ -175,15 +483,21 @@ class Parser(object):
         # We expect looking at a dash
         if self.current.type != 'dash':
             return 
-        sequence = []
+        sequence = self.start_sequence()
         n_plus_m = self.indentation
-        while self.current:
+        index = 0
+        while self.current is not None:
             self.indent()
-            if self.indentation < n_plus_m:
+            if self.indentation < n_plus_m or self.at_document_boundary():
                 break
-            entry = self.block_seq_entry(self.indentation)            
-            sequence.append(entry)
-        return sequence
+            if not self.enter(index):
+                self.skip_block(self.current.column - 1)
+            else:
+                entry = self.block_seq_entry(self.indentation)            
+                self.add_item(sequence, entry)
+                self.leave()
+            index += 1
+        return self.end_sequence(sequence)
 
     def block_seq_entry(self, n):
         '''
@@ -198,8 +512,12 @@ class Parser(object):
         if not self.current.type == 'dash':
             raise Exception('Expected a "dash", found a {}'.format(self.current))
         self.advance()
+        if self.current and self.current.type not in LINE_PREFIX:
+            # A compact sequence or mapping starts at the column of its first
+            # node, which is on the same line as the dash.
+            self.indentation = self.current.column - 1
         self.indent()
-        return self.block_node(n, 'block-in') # TODO: compact-sequence, compact-mapping, e-node, comments
+        return self.block_node(n, 'block-in') # TODO: e-node, comments
 
     def flow_in_block(self, n):
         '''
@@ -217,7 +535,193 @@ class Parser(object):
                               ns-flow-content(n,c) )
                             | e-scalar ) )
         '''
-        return self.flow_content(n, c) # TODO: alias, properties, separate, e-scalar
+        if self.current.type == 'alias':
+            return self.alias(self.consume_and_advance()[1:])
+        if self.current.type in FLOW_COLLECTION:
+            return self.flow_collection(n, c)
+        return self.scalar(self.flow_content(n, c)) # TODO: properties, separate, e-scalar
+
+    def flow_collection(self, n, c):
+        '''
+        c-flow-sequence(n,c) ::= “[” s-separate(n,c)? ns-s-flow-seq-entries(n,in-flow(c))? “]”
+        ns-s-flow-seq-entries(n,c) ::= ns-flow-seq-entry(n,c) s-separate(n,c)?
+                                       ( “,” s-separate(n,c)? ns-s-flow-seq-entries(n,c)? )?
+        ns-flow-seq-entry(n,c) ::= ns-flow-pair(n,c) | ns-flow-node(n,c)
+        c-flow-mapping(n,c) ::= “{” s-separate(n,c)? ns-s-flow-map-entries(n,in-flow(c))? “}”
+        ns-s-flow-map-entries(n,c) ::= ns-flow-map-entry(n,c) s-separate(n,c)?
+                                       ( “,” s-separate(n,c)? ns-s-flow-map-entries(n,c)? )?
+        ns-flow-map-implicit-entry(n,c) ::= ns-flow-map-yaml-key-entry(n,c)
+                                            | c-ns-flow-map-empty-key-entry(n,c)
+                                            | c-ns-flow-map-json-key-entry(n,c)
+
+        Nested flow collections are parsed in a loop over an explicit stack of
+        frames [closing, collection, key or index, anchor], without going
+        through the grammar methods per entry. A single pair in a flow
+        sequence is a mapping, whose frame has no closing token.
+        '''
+        stack = []
+        node = self.open_flow_node(n, c, stack)
+        while stack:
+            frame = stack[-1]
+            closing, collection = frame[0], frame[1]
+            if node is not NO_NODE:
+                if closing == 'close_sequence':
+                    self.add_item(collection, node)
+                    frame[2] += 1
+                else:
+                    self.set_item(collection, frame[2], node)
+                self.leave()
+                if closing is None:
+                    # A single pair ends with its value
+                    stack.pop()
+                    node = self.end_mapping(collection)
+                    continue
+                node = NO_NODE
+                self.flow_entry_end(closing)
+            if self.current.type in LINE_PREFIX:
+                self.separate()
+            kind = self.current.type
+            if kind == closing:
+                self.advance()
+                stack.pop()
+                node = self.end_sequence(collection) if closing == 'close_sequence' else self.end_mapping(collection)
+                if frame[3] is not None:
+                    self.anchor(frame[3], node)
+                continue
+            if closing == 'close_sequence':
+                if not self.enter(frame[2]):
+                    self.skip_flow_node(n, c)
+                    frame[2] += 1
+                    self.flow_entry_end(closing)
+                    continue
+                if kind != 'scalar' or self.next is None or self.next.type != 'colon':
+                    node = self.open_flow_node(n, c, stack)
+                    continue
+                # ns-flow-pair(n,c)
+                frame = [None, self.start_mapping(), None, None]
+                stack.append(frame)
+                closing, collection = None, frame[1]
+            # ns-flow-map-implicit-entry(n,c)
+            key = self.flow_content(n, 'flow-key')
+            if type(key) is str:
+                key = key.rstrip()
+            self.separate()
+            if not self.enter(key):
+                if self.current.type == 'colon':
+                    self.advance()
+                    self.skip_flow_node(n, c)
+                if closing is None:
+                    stack.pop()
+                    node = self.end_mapping(collection)
+                else:
+                    self.flow_entry_end(closing)
+                continue
+            frame[2] = key
+            self.mapping_key(key)
+            if self.current.type == 'colon':
+                self.advance()
+                node = self.open_flow_node(n, c, stack)
+            else:
+                node = None # e-node
+        return node
+
+    def open_flow_node(self, n, c, stack):
+        # Returns the node, unless it is a flow collection, which is pushed
+        # onto `stack` instead.
+        if self.current.type in LINE_PREFIX:
+            self.separate()
+        anchor = self.properties()
+        if anchor is not None:
+            self.separate()
+        current = self.current
+        kind = current.type
+        if kind in FLOW_COLLECTION:
+            if kind == 'open_sequence':
+                stack.append([FLOW_COLLECTION[kind], self.start_sequence(), 0, anchor])
+            else:
+                stack.append([FLOW_COLLECTION[kind], self.start_mapping(), None, anchor])
+            self.advance()
+            return NO_NODE
+        if kind == 'scalar':
+            value = self.flow_content(n, 'flow-in')
+            node = self.scalar(value.rstrip() if type(value) is str else value)
+        elif kind == 'alias':
+            node = self.alias(self.consume_and_advance()[1:])
+        elif kind == 'comma' or kind in FLOW_CLOSING:
+            node = None # e-node
+        else:
+            raise Exception('Expected a flow node, found a {}'.format(current))
+        if anchor is not None:
+            self.anchor(anchor, node)
+        return node
+
+    def flow_entry_end(self, closing):
+        # Consumes the comma after an entry of a flow collection
+        if self.current.type in LINE_PREFIX:
+            self.separate()
+        if self.current.type == 'comma':
+            self.advance()
+        elif self.current.type != closing:
+            raise Exception('Expected a "comma", found a {}'.format(self.current))
+
+    def separate(self):
+        '''
+        s-separate(n,c) ::= c = flow-out ⇒ s-separate-lines(n)
+                            c = flow-in  ⇒ s-separate-lines(n)
+        '''
+        # Inside flow collections, line breaks, indentation and comments only
+        # separate tokens.
+        current = self.current
+        while current is not None and current.type in LINE_PREFIX:
+            self.advance()
+            current = self.current
+
+    def alias(self, name):
+        '''
+        c-ns-alias-node ::= “*” ns-anchor-name
+        '''
+        if name not in self.anchors:
+            raise Exception('Undefined alias "{}"'.format(name))
+        expansion, depth = self.alias_costs[name]
+        depth += 1
+        self.expansion += expansion
+        if self.expansion > self.max_alias_expansion:
+            raise Exception('Aliases expand to more than {} nodes'.format(self.max_alias_expansion))
+        if depth > self.max_alias_depth:
+            raise Exception('Aliases are nested deeper than {}'.format(self.max_alias_depth))
+        if self.open_anchors:
+            costs = self.open_anchors[-1]
+            costs[1] += expansion
+            costs[2] = max(costs[2], depth)
+        return self.anchors[name]
+
+    def properties(self):
+        '''
+        c-ns-properties(n,c) ::=   ( c-ns-tag-property
+                                 ( s-separate(n,c) c-ns-anchor-property )? )
+                               | ( c-ns-anchor-property
+                                 ( s-separate(n,c) c-ns-tag-property )? )
+        c-ns-anchor-property ::= “&” ns-anchor-name
+        '''
+        # Tags are skipped by `advance`. Returns the name of the anchor or None.
+        # Every node starts with its properties, so the nodes are counted here.
+        self.nodes += 1
+        if self.current is None or self.current.type != 'anchor':
+            return None
+        self.open_anchors.append([self.nodes - 1, 0, 0])
+        return self.consume_and_advance()[1:]
+
+    def anchor(self, name, node):
+        # Registers `node` for the following aliases to `name`. An anchored
+        # node counts as the nodes built within it plus the expansion of the
+        # aliases within.
+        start, expansion, depth = self.open_anchors.pop()
+        self.anchors[name] = node
+        self.alias_costs[name] = (self.nodes - start + expansion, depth)
+        if self.open_anchors:
+            costs = self.open_anchors[-1]
+            costs[1] += expansion
+            costs[2] = max(costs[2], depth)
 
     def flow_content(self, n, c):
         '''
@@ -237,22 +741,140 @@ class Parser(object):
                                     /* Followed by an ns-plain-safe(c)) */ ) 
         nb-ns-plain-in-line(c) 	::= 	( s-white* ns-plain-char(c) )* 
         '''
-        if c in ['flow-out', 'flow-in']:
-            # TODO: Handle multi-line
-            if not self.current.type == 'scalar':
-                raise Exception('Expected a "scalar" found a {}'.format(self.current))
-            return self.consume_and_advance()
-        elif c in ['block-key', 'flow-key']:
-            if not self.current.type == 'scalar':
-                raise Exception('Expected a "scalar" found a {}'.format(self.current))
-            return self.consume_and_advance()
-        else:
+        if c not in PLAIN:
             raise Exception('Invalid value for c: "{}"'.format(c))
+        # TODO: Handle multi-line
+        if self.current.type != 'scalar':
+            raise Exception('Expected a "scalar" found a {}'.format(self.current))
+        return self.consume_and_advance()
 
-    def indent(self):
-        if self.current.type == 'newline':
-            self.indentation = 0
+    # Construction hooks. The grammar methods call these in document order,
+    # so subclasses can produce something else than dicts and lists.
+
+    def start_mapping(self):
+        return {}
+
+    def mapping_key(self, key):
+        pass
+
+    def set_item(self, mapping, key, value):
+        mapping[key] = value
+
+    def end_mapping(self, mapping):
+        return mapping
+
+    def start_sequence(self):
+        return []
+
+    def add_item(self, sequence, item):
+        sequence.append(item)
+
+    def end_sequence(self, sequence):
+        if self.numeric_arrays:
+            return self.numeric_array(sequence)
+        return sequence
+
+    def scalar(self, value):
+        return value
+
+    def enter(self, key):
+        # Descends into the child `key` (or index) of the current collection.
+        # Returns False, if the child is not selected and must be skipped.
+        if self.path is None:
+            return True
+        self.path.append(key)
+        if self.select is None or self.selected(self.path):
+            return True
+        self.path.pop()
+        return False
+
+    def leave(self):
+        if self.path is not None:
+            self.path.pop()
+
+    def selected(self, path):
+        # Whether `path` leads to the selected path or lies below it
+        for part, pattern in zip(path, self.select):
+            if pattern != '*' and pattern != part:
+                return False
+        return True
+
+    def skip_block(self, indentation):
+        # Fast-forwards over the rest of the current line and all following
+        # lines indented deeper than `indentation`, without building anything.
+        while self.current and not self.at_document_boundary():
+            if self.current.type == 'newline' and self.next is not None:
+                if self.next.type == 'indentation':
+                    if len(self.next.value) <= indentation:
+                        return
+                elif self.next.type not in BLANK_LINE:
+                    return
+            if self.current.type == 'anchor':
+                if self.skip_anchored_node(indentation):
+                    return
+                continue
+            if self.current.type in FLOW_COLLECTION:
+                self.skip_flow_collection()
+                continue
             self.advance()
-        if self.current.type == 'indentation':
-            self.indentation = len(self.current.value)
+
+    def skip_flow_collection(self):
+        # Fast-forwards over the flow collection, which starts at the current
+        # token, including its lines.
+        self.advance()
+        while self.current.type not in FLOW_CLOSING:
+            self.skip_flow_node(0, 'flow-in')
+            if self.current.type == 'comma':
+                self.advance()
+        self.advance()
+
+    def skip_anchored_node(self, indentation):
+        # Anchored nodes are built even if they are not selected, as aliases
+        # on the selected path may refer to them. Returns True, if the node
+        # ends the block to skip.
+        select, self.select = self.select, None
+        try:
+            self.block_node(self.indentation, 'block-out')
+        finally:
+            self.select = select
+        current = self.current
+        return current is not None and current.type not in LINE_PREFIX and self.indentation <= indentation
+
+    def skip_flow_node(self, n, c):
+        # Fast-forwards to the comma or the closing token after the current
+        # entry of a flow collection.
+        depth = 0
+        while self.current is not None:
+            kind = self.current.type
+            if kind in FLOW_COLLECTION:
+                depth += 1
+            elif kind in FLOW_CLOSING:
+                if not depth:
+                    return
+                depth -= 1
+            elif kind == 'comma' and not depth:
+                return
+            elif kind == 'anchor':
+                self.skip_anchored_flow_node(n, c)
+                continue
+            self.advance()
+
+    def skip_anchored_flow_node(self, n, c):
+        # Same as `skip_anchored_node` within a flow collection
+        select, self.select = self.select, None
+        try:
+            self.flow_collection(n, c)
+        finally:
+            self.select = select
+
+    def indent(self):
+        # Skips line breaks, blank lines and comment lines, remembering the
+        # indentation of the last line.
+        current = self.current
+        while current is not None and current.type in LINE_PREFIX:
+            if current.type == 'newline':
+                self.indentation = 0
+            elif current.type == 'indentation':
+                self.indentation = len(current.value)
             self.advance()
+            current = self.current
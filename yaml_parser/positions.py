@@ -0,0 +1,140 @@
+import bisect, collections
+from array import array
+
+from .parser import Parser, LINE_PREFIX
+
+# Positions are stored as single integers, which sort like (line, column)
+COLUMN_BITS = 32
+
+def position_key(line, column):
+    return line << COLUMN_BITS | column
+
+def position(key):
+    return key >> COLUMN_BITS, key & (1 << COLUMN_BITS) - 1
+
+class SourceMap(object):
+    '''
+    Side index of the source spans of the nodes of a document. Nodes are
+    numbered in document order; their start and end positions and the number
+    of their parent node are stored in parallel arrays, and `index` maps the
+    path of each node (a tuple of keys and sequence indices) to its number.
+    Ends are exclusive.
+    '''
+
+    def __init__(self):
+        self.starts = array('Q')
+        self.ends = array('Q')
+        self.parents = array('i')
+        self.paths = []
+        self.index = {}
+
+    def __len__(self):
+        return len(self.paths)
+
+    def add(self, path, start, parent):
+        # Adds a node, whose end is set later, and returns its number
+        node = len(self.paths)
+        self.starts.append(start)
+        self.ends.append(start)
+        self.parents.append(parent)
+        self.paths.append(path)
+        self.index[path] = node
+        return node
+
+    def span(self, path):
+        # Returns the (line, column) of the start and the end of a node
+        node = self.index[tuple(path)]
+        return position(self.starts[node]), position(self.ends[node])
+
+    def path_at(self, line, column):
+        '''
+        Returns the path of the innermost node, whose span contains the
+        position, or None. The last node starting at or before the position
+        is found by bisection, then its ancestors are checked.
+        '''
+        key = position_key(line, column)
+        node = bisect.bisect_right(self.starts, key) - 1
+        while node >= 0 and self.ends[node] <= key:
+            node = self.parents[node]
+        return self.paths[node] if node >= 0 else None
+
+class PositionParser(Parser):
+    '''
+    Parser, which records the source span of every node it builds in a
+    `SourceMap` as `source_map`.
+    '''
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        if self.path is None:
+            self.path = []
+
+    def start(self):
+        self.source_map = SourceMap()
+        self.open_nodes = []
+        self.scalar_ends = collections.deque()
+        self.last_start = self.last_end = None
+        self.tokenizer = self.record_scalar_ends(self.tokenizer)
+        super().start()
+
+    def record_scalar_ends(self, tokens):
+        # Scalars may be resolved to other types than strings later, so
+        # their end columns are taken from the tokenizer.
+        for token in tokens:
+            if token.type == 'scalar':
+                self.scalar_ends.append(token.column + len(token.value.rstrip()))
+            yield token
+
+    def advance(self):
+        # Remembers the span of the last token, which is not a line prefix,
+        # as the end of the node, which is completed next.
+        current = self.current
+        if current is not None and current.type not in LINE_PREFIX:
+            if current.type == 'scalar':
+                end = self.scalar_ends.popleft()
+            else:
+                end = current.column + len(current.value)
+            self.last_start = position_key(current.line, current.column)
+            self.last_end = position_key(current.line, end)
+        super().advance()
+
+    def open_node(self, start):
+        parent = self.open_nodes[-1] if self.open_nodes else -1
+        self.open_nodes.append(self.source_map.add(tuple(self.path), start, parent))
+
+    def close_node(self):
+        self.source_map.ends[self.open_nodes.pop()] = self.last_end
+
+    def start_mapping(self):
+        self.open_node(position_key(self.current.line, self.current.column))
+        return super().start_mapping()
+
+    def end_mapping(self, mapping):
+        self.close_node()
+        return super().end_mapping(mapping)
+
+    def start_sequence(self):
+        self.open_node(position_key(self.current.line, self.current.column))
+        return super().start_sequence()
+
+    def end_sequence(self, sequence):
+        self.close_node()
+        return super().end_sequence(sequence)
+
+    def scalar(self, value):
+        # The scalar token has just been consumed
+        self.open_node(self.last_start)
+        self.close_node()
+        return super().scalar(value)
+
+    def block_scalar(self, n, c):
+        # The span starts at the header, not at the last content line
+        start = position_key(self.current.line, self.current.column)
+        node = super().block_scalar(n, c)
+        self.source_map.starts[len(self.source_map) - 1] = start
+        return node
+
+    def alias(self, name):
+        self.open_node(self.last_start)
+        self.close_node()
+        return super().alias(name)
@@ -0,0 +1,101 @@
+import re, sys
+
+from .tokenizer import BLOCK_SCALAR
+
+'''
+Resolution of plain scalars according to the YAML core schema
+    http://yaml.org/spec/1.2/spec.html#id2804923
+'''
+
+CORE_SCHEMA = re.compile('|'.join([
+    r'(?P<null>null|Null|NULL|~)',
+    r'(?P<true>true|True|TRUE)',
+    r'(?P<false>false|False|FALSE)',
+    r'(?P<int>[-+]?[0-9]+)',
+    r'(?P<octal>0o[0-7]+)',
+    r'(?P<hexadecimal>0x[0-9a-fA-F]+)',
+    r'(?P<float>[-+]?(\.[0-9]+|[0-9]+(\.[0-9]*)?)([eE][-+]?[0-9]+)?)',
+    r'(?P<infinity>[-+]?\.(inf|Inf|INF))',
+    r'(?P<nan>\.nan|\.NaN|\.NAN)',
+]))
+
+CONSTRUCTORS = {
+    'null': lambda value: None,
+    'true': lambda value: True,
+    'false': lambda value: False,
+    'int': int,
+    'octal': lambda value: int(value[2:], 8),
+    'hexadecimal': lambda value: int(value[2:], 16),
+    'float': float,
+    'infinity': lambda value: float(value.replace('.', '')),
+    'nan': lambda value: float('nan'),
+}
+
+# Maximum number of distinct scalars remembered by `Resolver`
+MEMO_SIZE = 4096
+
+class Resolver(object):
+    '''
+    Types plain scalars as None, bool, int or float, or leaves them as
+    strings. Results are remembered for repeated values, so each distinct
+    literal is matched only once.
+    '''
+
+    def __init__(self, memo_size=MEMO_SIZE):
+        self.memo = {}
+        self.memo_size = memo_size
+
+    def resolve(self, value):
+        try:
+            return self.memo[value]
+        except KeyError:
+            pass
+        m = CORE_SCHEMA.fullmatch(value.rstrip())
+        resolved = CONSTRUCTORS[m.lastgroup](m.group()) if m else value
+        if len(self.memo) < self.memo_size:
+            self.memo[value] = resolved
+        return resolved
+
+    def tokens(self, tokens):
+        # Yields `tokens` with the values of scalars resolved. Mapping keys,
+        # which remain strings, are interned, so that the keys of repeated
+        # mappings share one string. The lines of block scalars are left as
+        # they are; like the lexer, they are recognized by their indentation.
+        resolve, intern = self.resolve, sys.intern
+        tokens = iter(tokens)
+        current = next(tokens, None)
+        # The indentation of the current line, and whether its first token
+        # is still to come
+        width, first = 0, True
+        # The indentations of the header line and of the content of the
+        # current block scalar
+        block_scalar = None
+        while current is not None:
+            following = next(tokens, None)
+            kind = current.type
+            if kind == 'newline':
+                width, first = 0, True
+            elif kind == 'indentation':
+                width = len(current.value)
+            else:
+                content = False
+                if first and block_scalar is not None:
+                    header, indentation = block_scalar
+                    content = kind == 'scalar' and (width == indentation or indentation is None and width > header)
+                    if content:
+                        block_scalar[1] = width
+                    else:
+                        block_scalar = None
+                if kind == 'scalar' and not content:
+                    value = resolve(current.value)
+                    if following is not None and following.type == 'colon' and type(value) is str:
+                        value = intern(value)
+                    current = current._replace(value=value)
+                elif kind in BLOCK_SCALAR:
+                    block_scalar = [width, None]
+                first = False
+            yield current
+            current = following
+
+def resolve_tokens(tokens, memo_size=MEMO_SIZE):
+    return Resolver(memo_size).tokens(tokens)
@@ -0,0 +1,76 @@
+'''
+Assembly of the values of block scalars
+    http://yaml.org/spec/1.2/spec.html#id2793652
+'''
+
+def block_scalar_parts(lines, folded, chomping, breaks):
+    '''
+    Returns the pieces of the value of a block scalar, which are joined
+    without separator. `lines` are pairs of the number of empty lines before
+    a content line and the content line, `chomping` is '-', '+' or '' and
+    `breaks` is the number of line breaks after the last content line (or
+    after the header, if there are no content lines).
+
+    Folding and chomping are applied in the same pass, so the value is built
+    by a single join.
+    '''
+    parts = []
+    indented = False
+    for number, (empty, line) in enumerate(lines):
+        # Line breaks between lines are folded into spaces, except around
+        # more indented lines
+        more = line[:1] in (' ', '\t')
+        if not number:
+            separator = '\n' * empty
+        elif not folded or indented or more:
+            separator = '\n' * (empty + 1)
+        else:
+            separator = '\n' * empty if empty else ' '
+        if separator:
+            parts.append(separator)
+        parts.append(line)
+        indented = more
+    if chomping == '+':
+        parts.append('\n' * breaks)
+    elif chomping == '' and lines and breaks:
+        parts.append('\n')
+    return parts
+
+class LazyString(object):
+    '''
+    Handle of the value of a block scalar, which keeps its pieces until it
+    is first converted with `str`. `write` passes the pieces to a file
+    without joining them at all.
+    '''
+
+    def __init__(self, parts):
+        self.parts = parts
+        self.value = None
+
+    def __str__(self):
+        if self.value is None:
+            self.value = ''.join(self.parts)
+            self.parts = None
+        return self.value
+
+    def __len__(self):
+        if self.parts is None:
+            return len(self.value)
+        return sum(map(len, self.parts))
+
+    def __eq__(self, other):
+        if isinstance(other, LazyString):
+            other = str(other)
+        return str(self) == other
+
+    def __hash__(self):
+        return hash(str(self))
+
+    def __repr__(self):
+        return 'LazyString({!r})'.format(str(self))
+
+    def write(self, f):
+        if self.parts is None:
+            f.write(self.value)
+        else:
+            f.writelines(self.parts)
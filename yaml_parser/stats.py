@@ -0,0 +1,128 @@
+import collections, time, tracemalloc
+
+# Grammar methods of `Parser`, whose calls are counted
+PRODUCTIONS = (
+    'stream', 'any_document', 'bare_document', 'explicit_document',
+    'block_node', 'open_block_node', 'block_in_block', 'block_scalar',
+    'block_collection', 'block_mapping', 'block_map_entry',
+    'block_map_implicit_entry', 'block_map_implicit_key',
+    'block_map_implicit_value', 'block_sequence', 'block_seq_entry',
+    'flow_in_block', 'flow_node', 'flow_content',
+    'flow_collection', 'open_flow_node', 'properties', 'alias', 'skip_block',
+)
+
+class Stats(object):
+    '''
+    Measurements of a parse: the number of tokens per type, the time spent in
+    the tokenizer and in the parser, the number of calls per production, the
+    maximum nesting of collections and, with `memory`, the peak of memory
+    allocated while parsing (traced by `tracemalloc`, which is slow).
+
+    A parser is instrumented by wrapping methods of the instance, so parsers
+    without `Stats` run unchanged.
+    '''
+
+    def __init__(self, memory=False):
+        self.memory = memory
+        self.token_counts = collections.Counter()
+        self.calls = collections.Counter()
+        self.tokenize_time = 0.0
+        self.total_time = 0.0
+        self.max_depth = 0
+        self.depth = 0
+        self.peak_memory = None
+
+    @property
+    def parse_time(self):
+        return self.total_time - self.tokenize_time
+
+    def tokens(self, tokens):
+        # Yields `tokens`, which may come from any tokenizer function, while
+        # counting them and timing the tokenizer.
+        counts, clock = self.token_counts, time.perf_counter
+        tokens = iter(tokens)
+        while True:
+            start = clock()
+            token = next(tokens, None)
+            self.tokenize_time += clock() - start
+            if token is None:
+                return
+            counts[token.type] += 1
+            yield token
+
+    def instrument(self, parser):
+        for name in PRODUCTIONS:
+            setattr(parser, name, self.counted(name, getattr(parser, name)))
+        for name in ['start_mapping', 'start_sequence']:
+            setattr(parser, name, self.opening(getattr(parser, name)))
+        for name in ['end_mapping', 'end_sequence']:
+            setattr(parser, name, self.closing(getattr(parser, name)))
+        start, parse, iter_documents = parser.start, parser.parse, parser.iter_documents
+        def start_with_stats():
+            parser.tokenizer = self.tokens(parser.tokenizer)
+            start()
+        def parse_with_stats():
+            self.begin()
+            try:
+                return parse()
+            finally:
+                self.end()
+        def iter_documents_with_stats():
+            self.begin()
+            try:
+                yield from iter_documents()
+            finally:
+                self.end()
+        parser.start = start_with_stats
+        parser.parse = parse_with_stats
+        parser.iter_documents = iter_documents_with_stats
+
+    def counted(self, name, method):
+        calls = self.calls
+        def wrapper(*args):
+            calls[name] += 1
+            return method(*args)
+        return wrapper
+
+    def opening(self, method):
+        def wrapper():
+            self.depth += 1
+            self.max_depth = max(self.max_depth, self.depth)
+            return method()
+        return wrapper
+
+    def closing(self, method):
+        def wrapper(collection):
+            self.depth -= 1
+            return method(collection)
+        return wrapper
+
+    def begin(self):
+        self.tracing = self.memory and not tracemalloc.is_tracing()
+        if self.tracing:
+            tracemalloc.start()
+        elif self.memory:
+            tracemalloc.reset_peak()
+        self.started = time.perf_counter()
+
+    def end(self):
+        self.total_time += time.perf_counter() - self.started
+        if self.memory:
+            self.peak_memory = tracemalloc.get_traced_memory()[1]
+            if self.tracing:
+                tracemalloc.stop()
+
+    def __str__(self):
+        lines = [
+            'Total time:    {:.6f} s'.format(self.total_time),
+            'Tokenize time: {:.6f} s'.format(self.tokenize_time),
+            'Parse time:    {:.6f} s'.format(self.parse_time),
+            'Maximum depth: {}'.format(self.max_depth),
+        ]
+        if self.peak_memory is not None:
+            lines.append('Peak memory:   {} bytes'.format(self.peak_memory))
+        lines.append('Tokens: {}'.format(sum(self.token_counts.values())))
+        lines.extend('  {:<20} {}'.format(*item) for item in self.token_counts.most_common())
+        lines.append('Calls:')
+        lines.extend('  {:<25} {}'.format(*item) for item in self.calls.most_common())
+        return '\n'.join(lines)
@@ -1,6 +1,6 @@
 
-import re, collections
-from colorama import Fore, Back, init, deinit
+import re, collections, functools, mmap, os, bisect
+from array import array
 
 PATTERNS = [
     # Collections
@@ -13,7 +13,6 @@ PATTERNS = [
     r'(?P<close_sequence>\])',
     r'(?P<open_mapping>\{)',
     r'(?P<close_mapping>\})',
-    r'(?P<comma>,(?=.*\]))',
     # Structures
     r'(?P<directive>^---)',
     r'(?P<end_of_document>^\.\.\.)',
@@ -21,77 +20,334 @@ PATTERNS = [
     r'(?P<alias>\*\w*)',
     r'(?P<complex_mapping_key>^\? )',
     # Scalars
-    r'(?P<literal>\|[-+]?$)',
-    r'(?P<folded>\>$)',
+    r'(?P<literal>\|(?:[-+]?[1-9]|[1-9]?[-+]?)(?=[ \t]+# |[ \t]*\r?$))',
+    r'(?P<folded>\>(?:[-+]?[1-9]|[1-9]?[-+]?)(?=[ \t]+# |[ \t]*\r?$))',
     r'(?P<scalar>[^,:&*#!\s]([^:,\n\r\]\[]|:(?=\S)|,(?=\S))*)',
     # Tags
     r'(?P<tag>!.+)',
 ]
 
-MASTER_PATTERN = re.compile('|'.join(PATTERNS), re.MULTILINE)
+# Inside flow collections, ',' is always an indicator and plain scalars end
+# at any flow indicator.
+FLOW_PATTERNS = [
+    # Collections
+    r'(?P<indentation>(^ +))',
+    r'(?P<newline>[\r\n])',
+    r'(?P<comment># .*)',
+    r'(?P<dash>(\-(?=\s)))',
+    r'(?P<colon>(\:(?=[\s,\]\}])))',
+    r'(?P<open_sequence>\[)',
+    r'(?P<close_sequence>\])',
+    r'(?P<open_mapping>\{)',
+    r'(?P<close_mapping>\})',
+    r'(?P<comma>,)',
+    # Structures
+    r'(?P<directive>^---)',
+    r'(?P<end_of_document>^\.\.\.)',
+    r'(?P<anchor>&\w*)',
+    r'(?P<alias>\*\w*)',
+    r'(?P<complex_mapping_key>^\? )',
+    # Scalars
+    r'(?P<scalar>[^,:&*#!\s\[\]{}]([^:,\n\r\[\]{}]|:(?=[^\s,\[\]{}]))*)',
+    # Tags
+    r'(?P<tag>![^\s,\[\]{}]+)',
+]
+
+PATTERN_SOURCES = {
+    'block': '|'.join(PATTERNS),
+    'flow': '|'.join(FLOW_PATTERNS),
+    # The indentation and the rest of a line of a block scalar
+    'line': r'( *)([^\r\n]*)',
+    # Characters, which `\w` and `\s` match differently in str and bytes
+    'non_ascii': r'[\x1c-\x1f\x80-\xff]',
+}
+
+@functools.lru_cache(maxsize=None)
+def compiled(name, encoded=False):
+    # Compiles a pattern on first use, so that importing the tokenizer does
+    # not compile any of them. With `encoded`, the pattern matches bytes.
+    source = PATTERN_SOURCES[name]
+    return re.compile(source.encode() if encoded else source, re.MULTILINE)
+
+# Module attributes, which are compiled patterns
+COMPILED_PATTERNS = {
+    'MASTER_PATTERN': ('block', False),
+    'FLOW_PATTERN': ('flow', False),
+    'BYTES_PATTERN': ('block', True),
+    'BYTES_FLOW_PATTERN': ('flow', True),
+}
+# Names, which are defined in `pretty`, so that colorama is only imported
+# for pretty printing
+PRETTY = {'prettyprint', 'print_token', 'TOKEN_STYLES'}
+
+def __getattr__(name):
+    if name in COMPILED_PATTERNS:
+        return compiled(*COMPILED_PATTERNS[name])
+    if name in PRETTY:
+        from . import pretty
+        return getattr(pretty, name)
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
 
 Token = collections.namedtuple('Token', ['type', 'value', 'line', 'column'])
 
-def file_tokenizer(filename, pattern=MASTER_PATTERN):
+class Lexer(object):
+    '''
+    Stateful lexer, which tracks the nesting depth of flow collections and
+    switches between the block context `pattern` and the flow context
+    `flow_pattern` accordingly. Every token is classified by a single match,
+    without scanning ahead for closing brackets.
+    '''
+
+    def __init__(self, pattern=None, flow_pattern=None):
+        self.patterns = (pattern or compiled('block'), flow_pattern or compiled('flow'))
+        self.line_pattern = compiled('line')
+        self.depth = 0
+        # Within a block scalar, the indentation of the line of its header
+        # and the indentation of its content, once it is known
+        self.block_scalar = None
+
+    def tokenize(self, source, lineno=1):
+        # Derives line and column from the match offsets, so a whole buffer
+        # can be tokenized in a single pass. Returns the number of the line
+        # after the last line break.
+        for kind, start, end, lineno, line_start in self.spans(source, lineno):
+            yield Token(kind, source[start:end], lineno, start - line_start + 1)
+        return self.lineno
+
+    def spans(self, source, lineno=1, pos=0, end=None):
+        # Yields the type, the start and the end offset, the line and the
+        # offset of the start of the line of each token of `source` (`str`
+        # or `bytes`) from `pos`, which starts a line, up to `end`. All
+        # tokenizers run this loop. Sets `lineno` to the number of the line
+        # after the last line break.
+        patterns = self.patterns
+        search = patterns[self.depth > 0].search
+        line_feed = '\n' if isinstance(source, str) else b'\n'
+        end = len(source) if end is None else end
+        line_start = pos
+        if self.block_scalar is not None and pos < end:
+            pos = yield from self.block_scalar_spans(source, pos, lineno)
+        while True:
+            m = search(source, pos, end)
+            if m is None:
+                self.lineno = lineno
+                return
+            kind = m.lastgroup
+            start, pos = m.span()
+            yield kind, start, pos, lineno, line_start
+            if kind == 'newline':
+                # '\r\n' is a single line break
+                if source[start:pos] == line_feed or source[pos:pos + 1] != line_feed:
+                    lineno += 1
+                    line_start = pos
+                    if self.block_scalar is not None and pos < end:
+                        pos = yield from self.block_scalar_spans(source, pos, lineno)
+            elif kind in OPENING:
+                self.depth += 1
+                search = patterns[1].search
+            elif kind in CLOSING and self.depth:
+                self.depth -= 1
+                search = patterns[self.depth > 0].search
+            elif kind in BLOCK_SCALAR:
+                self.start_block_scalar(source[line_start:start])
+
+    def start_block_scalar(self, prefix):
+        # The lines after a block scalar header, which is preceded by
+        # `prefix` on its line, are content lines as long as they are
+        # indented deeper than that line.
+        self.block_scalar = [len(prefix) - len(prefix.lstrip()), None]
+
+    def block_scalar_line(self, source, pos):
+        # Returns the ends of the indentation and of the content of the line
+        # starting at `pos`, if it belongs to the current block scalar. Else
+        # the block scalar ends and None is returned. Spaces of blank lines
+        # beyond the indentation of the content are content.
+        m = self.line_pattern.match(source, pos)
+        indentation_end, end = m.end(1), m.end(2)
+        width = indentation_end - pos
+        header, content = self.block_scalar
+        if indentation_end == end:
+            if content is not None and width > content:
+                return pos + content, end
+            return end, end
+        if content is None:
+            if width <= header:
+                self.block_scalar = None
+                return None
+            content = self.block_scalar[1] = width
+        elif width < content:
+            self.block_scalar = None
+            return None
+        return pos + content, end
+
+    def block_scalar_spans(self, source, pos, lineno):
+        # Yields the spans of the indentation and the content of the line
+        # starting at `pos`, if it belongs to the current block scalar, as one
+        # token each. Returns the position after them.
+        spans = self.block_scalar_line(source, pos)
+        if spans is None:
+            return pos
+        indentation_end, end = spans
+        if indentation_end > pos:
+            yield 'indentation', pos, indentation_end, lineno, pos
+        if end > indentation_end:
+            yield 'scalar', indentation_end, end, lineno, pos
+        return end
+
+class BytesLexer(Lexer):
+    '''
+    Lexer, which runs the patterns directly over an encoded buffer, e.g. a
+    memory mapped file. Only the matched token values are decoded.
+
+    In byte patterns, `\\w` and `\\s` only match ASCII characters. So the
+    buffer is tokenized in regions of whole lines, and regions with other
+    characters are decoded and tokenized with the str patterns instead.
+    '''
+
+    # The minimal size of a region in bytes
+    region = 2**16
+
+    def __init__(self, pattern=None, flow_pattern=None, encoding='utf8'):
+        super().__init__(pattern or compiled('block', True), flow_pattern or compiled('flow', True))
+        self.line_pattern = compiled('line', True)
+        self.encoding = encoding
+        self.text_lexer = Lexer()
+
+    def tokenize(self, source, lineno=1):
+        non_ascii = compiled('non_ascii', True).search
+        text_lexer = self.text_lexer
+        pos = 0
+        while pos < len(source):
+            end = source.find(b'\n', pos + self.region) + 1 or len(source)
+            if non_ascii(source, pos, end) is None:
+                lineno = yield from self.tokenize_region(source, pos, end, lineno)
+            else:
+                # The state of the lexer is passed on to the str lexer and back
+                text_lexer.depth, text_lexer.block_scalar = self.depth, self.block_scalar
+                lineno = yield from text_lexer.tokenize(source[pos:end].decode(self.encoding), lineno)
+                self.depth, self.block_scalar = text_lexer.depth, text_lexer.block_scalar
+            pos = end
+        return lineno
+
+    def tokenize_region(self, source, pos, end, lineno):
+        # Same as `Lexer.tokenize` for the ASCII characters from `pos` to
+        # `end`, which start a line.
+        encoding = self.encoding
+        for kind, start, stop, lineno, line_start in self.spans(source, lineno, pos, end):
+            yield Token(kind, source[start:stop].decode(encoding), lineno, start - line_start + 1)
+        return self.lineno
+
+OPENING = {'open_sequence', 'open_mapping'}
+CLOSING = {'close_sequence', 'close_mapping'}
+BLOCK_SCALAR = {'literal', 'folded'}
+
+def file_tokenizer(filename, pattern=None, buffered=False):
+    lexer = Lexer(pattern)
     with open(filename, 'r', encoding='utf8') as f:
+        if buffered:
+            # Read the whole file and tokenize it in a single pass
+            yield from lexer.tokenize(f.read())
+            return
         lineno = 1
         for line in f:
-            for token in line_tokenizer(line, lineno, pattern):
+            for token in lexer.tokenize(line, lineno):
                 yield token
             lineno += 1
 
-def string_tokenizer(source, pattern=MASTER_PATTERN):
-    lineno = 1
-    for line in source.splitlines(keepends=True):
-        for token in line_tokenizer(line, lineno, pattern):
-            yield token
-        lineno +=1
-
-def line_tokenizer(line, lineno, pattern=MASTER_PATTERN):
-    for m in pattern.finditer(line):
-        kind = m.lastgroup
-        value = m.group()
-        column = m.start() + 1
-        token = Token(kind, value, lineno, column)
-        yield token
-
-def prettyprint(filename, encoding='utf8'):
-    init()
-    try:
-        for token in file_tokenizer(filename):
-            print_token(token)
-        print()
-    finally:
-        deinit()
-
-TOKEN_STYLES = {
-    'indentation': Back.CYAN,
-    'newline': Back.CYAN,
-    'comment': Back.LIGHTBLUE_EX,
-    'dash': Back.RED,
-    'colon': Back.RED,
-    'open_sequence': Back.YELLOW + Fore.BLUE,
-    'close_sequence': Back.YELLOW + Fore.BLUE,
-    'open_mapping': Back.YELLOW + Fore.BLUE,
-    'close_mapping': Back.YELLOW + Fore.BLUE,
-    'comma': Back.YELLOW + Fore.BLUE,
-    # Structures
-    'directive': Back.RED,
-    'end_of_document': Back.RED,
-    'anchor': Back.BLUE,
-    'alias': Back.BLUE,
-    'complex_mapping_key': Back.RED,
-    # Scalars
-    'literal': Back.MAGENTA,
-    'folded': Back.MAGENTA,
-    'scalar': Back.GREEN,
-    # Tags
-    'tag': Back.LIGHTRED_EX + Fore.CYAN,
-}
+def mmap_tokenizer(filename, encoding='utf8'):
+    # Tokenizes a memory mapped file, so that large files are never copied
+    # into Python line strings.
+    with open(filename, 'rb') as f:
+        if not os.fstat(f.fileno()).st_size:
+            return # empty files cannot be mapped
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            yield from BytesLexer(encoding=encoding).tokenize(buffer)
+
+def string_tokenizer(source, pattern=None):
+    return buffer_tokenizer(source, pattern)
+
+def buffer_tokenizer(source, pattern=None, lineno=1):
+    return Lexer(pattern).tokenize(source, lineno)
+
+def line_tokenizer(line, lineno, pattern=None, lexer=None):
+    # Pass a `lexer` to carry the flow context from one line to the next.
+    lexer = lexer or Lexer(pattern)
+    return lexer.tokenize(line, lineno)
+
+TOKEN_TYPES = tuple(dict.fromkeys(re.findall(r'\(\?P<(\w+)>', ''.join(PATTERNS + FLOW_PATTERNS))))
+TYPE_CODES = {kind: code for code, kind in enumerate(TOKEN_TYPES)}
+
+class CompactTokens(object):
+    '''
+    Compact sequence of the tokens of `source`. Instead of a `Token` per
+    token, it stores integer type codes and the start and end offsets of
+    the tokens in `source` in parallel arrays. Values are sliced from
+    `source` and `Token`s are created only when a token is accessed.
+    '''
+
+    def __init__(self, source, pattern=None):
+        self.source = source
+        offset = 'I' if len(source) < 2**32 else 'Q'
+        self.types = array('B')
+        self.starts = array(offset)
+        self.ends = array(offset)
+        self.line_starts = array(offset, [0])
+        # Same as `Lexer.tokenize`, but without creating a `Token` per token
+        codes = TYPE_CODES
+        types, starts, ends = self.types.append, self.starts.append, self.ends.append
+        line_starts = self.line_starts.append
+        line = 1
+        for kind, start, end, lineno, line_start in Lexer(pattern).spans(source):
+            types(codes[kind])
+            starts(start)
+            ends(end)
+            if lineno != line:
+                line = lineno
+                line_starts(line_start)
+
+    def __len__(self):
+        return len(self.types)
+
+    def __getitem__(self, index):
+        start = self.starts[index]
+        line = bisect.bisect_right(self.line_starts, start)
+        return Token(
+            TOKEN_TYPES[self.types[index]],
+            self.source[start:self.ends[index]],
+            line,
+            start - self.line_starts[line - 1] + 1,
+        )
+
+    def __iter__(self):
+        return self.tokens()
+
+    def tokens(self, start=0, stop=None):
+        # Yields the tokens from index `start` up to `stop`
+        source, types, line_starts = self.source, TOKEN_TYPES, self.line_starts
+        stop = len(self) if stop is None else stop
+        if start >= stop:
+            return
+        line = self.line(start)
+        next_line = line_starts[line] if len(line_starts) > line else len(source) + 1
+        for index in range(start, stop):
+            offset = self.starts[index]
+            while offset >= next_line:
+                line += 1
+                next_line = line_starts[line] if len(line_starts) > line else len(source) + 1
+            yield Token(types[self.types[index]], source[offset:self.ends[index]], line, offset - line_starts[line - 1] + 1)
+
+    def line(self, index):
+        return bisect.bisect_right(self.line_starts, self.starts[index])
+
+    def column(self, index):
+        start = self.starts[index]
+        return start - self.line_starts[bisect.bisect_right(self.line_starts, start) - 1] + 1
+
+    def type(self, index):
+        return TOKEN_TYPES[self.types[index]]
+
+    def value(self, index):
+        return self.source[self.starts[index]:self.ends[index]]
 
-def print_token(token):
-    prefix = TOKEN_STYLES.get(token.type, '')
-    prefix += '\\n' if token.type == 'newline' else ''
-    suffix = Back.RESET + Fore.RESET
-    suffix += '' if token.value.endswith('\n') else ' '
-    print(prefix + token.value + suffix, end='')
+def compact_tokenizer(source, pattern=None):
+    return CompactTokens(source, pattern)